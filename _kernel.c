@@ -0,0 +1,119 @@
+/* _kernel.c - the inner loop of search.solutions over flat arrays, loaded by kernel.py */
+
+/* the first empty square from scan on, or -1 if there is none before end */
+static int findloc(const int *board, int scan, int end)
+{
+    for (int i = scan; i < end; i++) {
+        if (!board[i]) {
+            return i;
+        }
+    }
+    return -1;
+}
+
+static void paint(int *board, const int *offsets, int first, int last, int loc, int value)
+{
+    board[loc] = value;
+    for (int k = first; k < last; k++) {
+        board[loc + offsets[k]] = value;
+    }
+}
+
+/*
+ * run the search on to the next full board, and return its depth, the number of pieces in
+ * placed[] and locs[], or -1 when there are no more. The stack lives in the caller's arrays,
+ * so the next call carries on from the last full board:
+ *
+ * board            the squares, 0 for empty
+ * end              no square at or after end is empty
+ * offsets          the offsets after the anchor of shape s are
+ * offset_start     offsets[offset_start[s]] to offsets[offset_start[s + 1] - 1]
+ * piece_of         the piece of shape s
+ * candidates       the shapes to try at loc are
+ * candidate_start  candidates[candidate_start[loc]] to candidates[candidate_start[loc + 1] - 1]
+ * used, unique     the pieces on the board, and whether a piece may only be used once
+ * locs, positions  for every depth, the square being filled and the next candidate to try,
+ * placed           and the shape placed there
+ * state            the depth, and 0 before the first call
+ * nodes            counts the calls to findloc
+ */
+int next_solution(int *board, int end, const int *offsets, const int *offset_start,
+                  const int *piece_of, const int *candidates, const int *candidate_start,
+                  unsigned char *used, int unique, int *locs, int *positions, int *placed,
+                  int *state, long long *nodes)
+{
+    int depth = state[0];
+    int loc, shape;
+
+    if (!state[1]) {
+        state[1] = 1;
+        loc = findloc(board, 0, end);
+        (*nodes)++;
+        if (loc < 0) {
+            state[0] = 0;
+            return 0;
+        }
+        locs[0] = loc;
+        positions[0] = candidate_start[loc];
+    } else {
+        /* back up from the full board returned last time */
+        if (!depth) {
+            return -1;
+        }
+        depth--;
+        shape = placed[depth];
+        paint(board, offsets, offset_start[shape], offset_start[shape + 1], locs[depth], 0);
+        used[piece_of[shape]] = 0;
+    }
+
+    for (;;) {
+        int found = 0;
+        int position = positions[depth];
+        int stop;
+
+        loc = locs[depth];
+        stop = candidate_start[loc + 1];
+        while (position < stop) {
+            int k;
+            shape = candidates[position++];
+            if (unique && used[piece_of[shape]]) {
+                continue;
+            }
+            for (k = offset_start[shape]; k < offset_start[shape + 1]; k++) {
+                if (board[loc + offsets[k]]) {
+                    break;
+                }
+            }
+            if (k == offset_start[shape + 1]) {
+                found = 1;
+                break;
+            }
+        }
+        positions[depth] = position;
+        if (!found) {
+            if (!depth) {
+                state[0] = 0;
+                return -1;
+            }
+            depth--;
+            shape = placed[depth];
+            paint(board, offsets, offset_start[shape], offset_start[shape + 1], locs[depth], 0);
+            used[piece_of[shape]] = 0;
+            continue;
+        }
+
+        paint(board, offsets, offset_start[shape], offset_start[shape + 1], loc, 1);
+        used[piece_of[shape]] = 1;
+        placed[depth] = shape;
+        depth++;
+        /* every square before loc was full, and loc is now */
+        loc = findloc(board, loc + 1, end);
+        (*nodes)++;
+        if (loc < 0) {
+            state[0] = depth;
+            return depth;
+        }
+        locs[depth] = loc;
+        positions[depth] = candidate_start[loc];
+    }
+}
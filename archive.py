@@ -0,0 +1,260 @@
+# archive.py - an append-only binary file of packings, written as the search finds them
+import json
+import mmap
+import os
+from array import array
+
+from common import Board
+
+"""
+the file is MAGIC, then the length of the header as a varint and the header as JSON,
+then one record per packing: the number of pieces, then (piece_index, loc) for each
+placement, all as unsigned LEB128 varints. The placements are the same as in
+board_object.solution, so a packing of a few dozen pieces takes a few dozen bytes.
+
+next to it, filename.idx holds the byte offset of every STRIDE-th packing as 64 bit integers,
+so a reader can jump close to any packing without reading the file from the start
+"""
+MAGIC = b"PPA1"
+STRIDE = 1024
+
+
+def encode_varint(value, out):
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def board_header(board_object: Board, name):
+    """
+    what a reader needs to rebuild the board: its size, the shape table after rebuild_shapes,
+    and the squares blocked before any piece was placed. Call it on an empty board
+    """
+    return {
+        "name": name,
+        "width": board_object.width,
+        "length": board_object.length,
+        "margin": board_object.margin,
+        "unique": board_object.unique,
+        "shapes": board_object.shapes,
+        "blocked": {
+            str(i): cell
+            for i, cell in enumerate(board_object.board)
+            if cell is not None and cell != -1
+        },
+    }
+
+
+class ArchiveWriter(object):
+    """
+    appends packings to filename, creating it with header if it does not exist.
+    Opening an existing archive checks its header and carries on after its last packing
+    """
+
+    def __init__(self, filename, header):
+        self.filename = filename
+        self.count = 0
+        offsets = array("Q")
+        if os.path.exists(filename) and os.path.getsize(filename):
+            with ArchiveReader(filename) as reader:
+                if reader.header != json.loads(json.dumps(header)):
+                    raise ValueError(f"{filename} holds packings of a different board")
+                self.count = len(reader)
+                offsets = reader.offsets
+                end = reader.end
+            self.fh = open(filename, "r+b")
+            # drop a record cut short by a crash
+            self.fh.truncate(end)
+            self.fh.seek(end)
+        else:
+            self.fh = open(filename, "wb")
+            data = json.dumps(header).encode()
+            out = bytearray(MAGIC)
+            encode_varint(len(data), out)
+            self.fh.write(out + data)
+        self.index = open(filename + ".idx", "wb")
+        offsets.tofile(self.index)
+
+    def write(self, solution):
+        """
+        append one packing, a sequence of (piece_index, loc) placements
+        """
+        if not self.count % STRIDE:
+            array("Q", [self.fh.tell()]).tofile(self.index)
+        out = bytearray()
+        encode_varint(len(solution), out)
+        for piece_index, loc in solution:
+            encode_varint(piece_index, out)
+            encode_varint(loc, out)
+        self.fh.write(out)
+        self.count += 1
+
+    def add(self, board_object):
+        self.write(board_object.solution)
+
+    def close(self):
+        self.fh.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArchiveReader(object):
+    """
+    the packings in an archive, memory mapped. reader[n] is the n-th packing as a tuple of
+    (piece_index, loc) placements, and iterating goes through them in order
+    """
+
+    def __init__(self, filename):
+        with open(filename, "rb") as fh:
+            self.data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{filename} is not a packing archive")
+        size, pos = decode_varint(self.data, len(MAGIC))
+        self.header = json.loads(self.data[pos : pos + size])
+        self.start = pos + size
+        self.offsets = array("Q")
+        if os.path.exists(filename + ".idx"):
+            with open(filename + ".idx", "rb") as fh:
+                self.offsets.frombytes(fh.read())
+        self._scan()
+
+    def _scan(self):
+        # count the packings after the last indexed one, and index any the .idx file lacks
+        data = self.data
+        if self.offsets and self.offsets[-1] >= len(data):
+            # the .idx file belongs to a longer archive
+            self.offsets = array("Q")
+        if self.offsets:
+            count = (len(self.offsets) - 1) * STRIDE
+            pos = self.offsets[-1]
+        else:
+            count, pos = 0, self.start
+        end = len(data)
+        while pos < end:
+            record = pos
+            try:
+                pos = self._skip(pos)
+            except IndexError:
+                # the last record was cut short
+                pos = record
+                break
+            if not count % STRIDE and len(self.offsets) <= count // STRIDE:
+                self.offsets.append(record)
+            count += 1
+        # an offset from the .idx file can point at the record that was cut short
+        del self.offsets[(count + STRIDE - 1) // STRIDE :]
+        self.count = count
+        self.end = pos
+
+    def _skip(self, pos):
+        n, pos = decode_varint(self.data, pos)
+        for _ in range(0, 2 * n):
+            _, pos = decode_varint(self.data, pos)
+        return pos
+
+    def _read(self, pos):
+        data = self.data
+        n, pos = decode_varint(data, pos)
+        solution = []
+        for _ in range(0, n):
+            piece_index, pos = decode_varint(data, pos)
+            loc, pos = decode_varint(data, pos)
+            solution.append((piece_index, loc))
+        return tuple(solution), pos
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, n):
+        if n < 0:
+            n += self.count
+        if not 0 <= n < self.count:
+            raise IndexError(n)
+        pos = self.offsets[n // STRIDE]
+        for _ in range(0, n % STRIDE):
+            pos = self._skip(pos)
+        return self._read(pos)[0]
+
+    def __iter__(self):
+        pos = self.start
+        for _ in range(0, self.count):
+            solution, pos = self._read(pos)
+            yield solution
+
+    def board(self, board_class=Board):
+        """
+        an empty board like the one the packings were found on
+        """
+        header = self.header
+        board_object = board_class(
+            header["width"],
+            header["length"],
+            header["shapes"],
+            unique=header["unique"],
+            margin=header["margin"],
+        )
+        board_object.name = header["name"]
+        for i, cell in header["blocked"].items():
+            board_object.board[int(i)] = cell
+        # the shapes are already scaled to the board
+        board_object.build_tables()
+        return board_object
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def solution_to_str(board_object: Board, solution):
+    """
+    the letters Board.from_str reads for solution: the piece filling the first empty square,
+    going down the columns, for each piece in turn. board_object must be empty
+    """
+    anchors = {loc: piece_index for piece_index, loc in solution}
+    letters = []
+    try:
+        for _ in solution:
+            loc = board_object.findloc_rotated()
+            if loc not in anchors:
+                # the piece over this square starts on a square before it
+                raise ValueError(f"{solution} can not be written as a from_str string")
+            board_object.place_on_board(anchors[loc], loc)
+            letters.append(chr(ord("A") + anchors[loc]))
+    finally:
+        while board_object.solution:
+            board_object.remove_piece_from_board(*board_object.solution[-1])
+    return "".join(letters)
+
+
+def str_to_solution(board_object: Board, input_str):
+    """
+    the placements Board.from_str makes for input_str, on board_object, which must be empty
+    """
+    for char in input_str.strip():
+        board_object.place_on_board(ord(char) - ord("A"), board_object.findloc_rotated())
+    solution = tuple(board_object.solution)
+    for piece_index, loc in reversed(solution):
+        board_object.remove_piece_from_board(piece_index, loc)
+    return solution
@@ -0,0 +1,487 @@
+# benchmark.py - time the search engines on fixed workloads, and compare against a saved baseline
+import hashlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+from multiprocessing import get_context
+from time import perf_counter
+
+try:
+    import resource
+except ImportError:
+    # no peak memory on windows
+    resource = None
+
+from bitboard import BitBoard
+from common import Board, rebuild_shapes, output_to_svg
+from dedup import CanonicalKey
+from instrument import NodeCountingBoardMixin, SearchStats, instrument
+from iterative import IterativeSearch
+from polyomino import compile_shapes, parse
+from search import iter_solutions, solutions
+from symmetry import placement_cells, placement_symmetries
+import hexsol
+import kernel
+import single_packing
+
+# set by --bitboard
+board_class = Board
+
+
+def pentomino_board(width):
+    """
+    the hexsol.py board for width, and the roots, skip and reject its search uses
+    """
+    length = 8 if width == 8 else int(60 / width)
+    # rebuild_shapes scales the table in place, so every board gets its own copy
+    board_object = board_class(width, length, [list(shape) for shape in hexsol.shapes])
+    board_object.name = "pentominos"
+    if width == 8:
+        for loc in (10 * 5 + 5, 10 * 4 + 5, 10 * 4 + 4, 10 * 5 + 4):
+            board_object.board[loc] = 26
+    rebuild_shapes(board_object)
+    roots = [((0, top),) for top in hexsol.cross_all[width - 3] if top]
+    return board_object, dict(
+        roots=roots, skip=hexsol.skip_symmetric, reject=hexsol.is_reflection
+    )
+
+
+def packing_board(shapes, width, length):
+    """
+    the single_packing.py board for the shapes
+    """
+    shape_table, unique = single_packing.shape_sets[shapes]
+    board_object = board_class(
+        width, length, [list(shape) for shape in shape_table], unique=unique
+    )
+    board_object.name = shapes
+    rebuild_shapes(board_object)
+    return board_object, dict(first_piece=single_packing.first_piece)
+
+
+# build() makes the board and the search arguments, the quick workloads are run by default,
+# and render is the number of solutions to draw as svg after the search
+workloads = {
+    "pentominos-w3": dict(build=lambda: pentomino_board(3), quick=True),
+    "pentominos-w4": dict(build=lambda: pentomino_board(4), quick=True),
+    "pentominos-w5": dict(build=lambda: pentomino_board(5), quick=False),
+    "pentominos-w6": dict(build=lambda: pentomino_board(6), quick=False),
+    "pentominos-w8": dict(build=lambda: pentomino_board(8), quick=False),
+    # the hexomino and heptomino boards have no packings, so these --piece boards stand in
+    "l-tetromino-6x8": dict(build=lambda: orientation_board("X/X/XX", 6, 8), quick=True),
+    "l-tetromino-8x8": dict(build=lambda: orientation_board("X/X/XX", 8, 8), quick=False),
+    "p-pentomino-6x10": dict(build=lambda: orientation_board("XXX/XX", 6, 10), quick=True),
+    "l-tromino-6x9": dict(build=lambda: orientation_board("XX/X", 6, 9), quick=True),
+    "tetrominos-6x6": dict(build=lambda: packing_board("tetrominos", 6, 6), quick=True),
+    "tetrominos-6x8": dict(build=lambda: packing_board("tetrominos", 6, 8), quick=True),
+    "tetrominos-8x8": dict(build=lambda: packing_board("tetrominos", 8, 8), quick=False),
+    "svg-pentominos-w4": dict(build=lambda: pentomino_board(4), quick=True, render=20),
+}
+
+
+def recursive(board_object, roots=((),), first_piece=0, skip=None, reject=None):
+    """
+    search.solutions from every root, as the scripts run it
+    """
+    for root in roots:
+        for piece_index, loc in root:
+            board_object.place_on_board(piece_index, loc)
+        for _ in solutions(board_object, first_piece, skip):
+            if reject is None or not reject(board_object):
+                yield board_object
+        for piece_index, loc in reversed(root):
+            board_object.remove_piece_from_board(piece_index, loc)
+
+
+def iterative(board_object, **kwargs):
+    yield from IterativeSearch(board_object, **kwargs).solutions()
+
+
+def compiled(board_object, roots=((),), first_piece=0, skip=None, reject=None):
+    """
+    recursive, with the search run by _kernel.c when it is built
+    """
+    for root in roots:
+        for piece_index, loc in root:
+            board_object.place_on_board(piece_index, loc)
+        for _ in kernel.solutions(board_object, first_piece, skip):
+            if reject is None or not reject(board_object):
+                yield board_object
+        for piece_index, loc in reversed(root):
+            board_object.remove_piece_from_board(piece_index, loc)
+
+
+engines = {"recursive": recursive, "iterative": iterative, "kernel": compiled}
+
+
+def measure(workload, engine, repeat=1, bitboard=False):
+    """
+    run engine on workload repeat times, and return the fastest run's timings:
+    the seconds to the first solution and to the end of the search, the number of search nodes,
+    the peak memory of the process in kB, and a digest of the solutions in the order they came
+    """
+    global board_class
+    board_class = BitBoard if bitboard else Board
+    spec = workloads[workload]
+    result = None
+    for _ in range(0, repeat):
+        board_object, kwargs = spec["build"]()
+        # the nodes of the timed run, counted with one call more per node and nothing else
+        stats = instrument(board_object, SearchStats(every=0), NodeCountingBoardMixin).stats
+        found = []
+        first = None
+        start = perf_counter()
+        for _ in engines[engine](board_object, **kwargs):
+            if first is None:
+                first = perf_counter() - start
+            found.append(tuple(board_object.solution))
+        seconds = perf_counter() - start
+        if result is None or seconds < result["seconds"]:
+            result = dict(seconds=seconds, first_solution=first, nodes=stats.nodes)
+    result["solutions"] = len(found)
+    result["digest"] = hashlib.md5(repr(found).encode()).hexdigest()
+    result["nodes_per_second"] = round(result["nodes"] / result["seconds"])
+    if spec.get("render"):
+        # svg files go to the working directory, so draw them somewhere to throw away
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as scratch:
+            os.chdir(scratch)
+            start = perf_counter()
+            for solution in found[: spec["render"]]:
+                for piece_index, loc in solution:
+                    board_object.place_on_board(piece_index, loc)
+                output_to_svg(board_object)
+                for piece_index, loc in reversed(solution):
+                    board_object.remove_piece_from_board(piece_index, loc)
+            result["svg_seconds"] = perf_counter() - start
+            os.chdir(cwd)
+    if resource is not None:
+        result["peak_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def run(workload, engine, repeat=1, bitboard=False):
+    # each workload gets a fresh process, so the peak memory and the caches are its own
+    with get_context("spawn").Pool(1) as pool:
+        return pool.apply(measure, (workload, engine, repeat, bitboard))
+
+
+def micro(workload, repeat=3, bitboard=False):
+    """
+    the Board calls the search makes at every node, on their own: the nanoseconds per call,
+    and the bytes each call allocates and frees again, as tracemalloc sees them, for every
+    placement (or square) of the empty board. The calls go through a small wrapper, which
+    allocates as well. board_bytes is the memory the board holds
+    """
+    global board_class
+    board_class = BitBoard if bitboard else Board
+    # the shape caches are filled by the first board, and shared by the boards after it
+    workloads[workload]["build"]()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    board_object, _ = workloads[workload]["build"]()
+    board_bytes = tracemalloc.get_traced_memory()[0] - before
+    pairs = [
+        (piece_index, loc)
+        for loc, piece_indices in enumerate(board_object.placements)
+        for piece_index in piece_indices
+    ]
+    squares = [square for square, cell in enumerate(board_object.board) if cell is None]
+
+    def test(piece_index, loc):
+        board_object.test(loc, piece_index)
+
+    def place(piece_index, loc):
+        board_object.place_on_board(piece_index, loc)
+        board_object.remove_piece_from_board(piece_index, loc)
+
+    def is_hole(square):
+        board_object.is_hole(square)
+
+    def findloc(square):
+        board_object.findloc()
+
+    calls = {
+        "test": (test, pairs),
+        "place+remove": (place, pairs),
+        "is_hole": (is_hole, [(square,) for square in squares]),
+        "findloc": (findloc, [(square,) for square in squares]),
+    }
+    result = dict(board_bytes=board_bytes)
+    for name, (call, arguments) in calls.items():
+        transient = 0
+        for args in arguments:
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            call(*args)
+            transient += tracemalloc.get_traced_memory()[1] - current
+        seconds = None
+        tracemalloc.stop()
+        for _ in range(0, repeat):
+            start = perf_counter()
+            for args in arguments:
+                call(*args)
+            elapsed = perf_counter() - start
+            seconds = elapsed if seconds is None else min(seconds, elapsed)
+        tracemalloc.start()
+        result[name] = dict(
+            ns=round(1e9 * seconds / len(arguments)),
+            bytes=round(transient / len(arguments), 1),
+        )
+    tracemalloc.stop()
+    return result
+
+
+def run_micro(workload, repeat=3, bitboard=False):
+    with get_context("spawn").Pool(1) as pool:
+        return pool.apply(micro, (workload, repeat, bitboard))
+
+
+def parity(widths=None):
+    """
+    for every width in hexsol.cross_all, or in widths, the pentomino packings found by
+    search.solutions and by _kernel.c, as sets: (width, recursive, kernel). Widths with no
+    cross positions are skipped
+    """
+    found = []
+    for width in widths or range(3, 3 + len(hexsol.cross_all)):
+        if not any(hexsol.cross_all[width - 3]):
+            continue
+        packings = []
+        for engine in (recursive, compiled):
+            board_object, kwargs = pentomino_board(width)
+            packings.append(
+                set(tuple(board_object.solution) for _ in engine(board_object, **kwargs))
+            )
+        found.append((width, *packings))
+    return found
+
+
+def orientation_board(piece, width, length):
+    """
+    a board packed with one piece, drawn as for --piece, that gives each orientation its own
+    type as the single_packing.py tables do
+    """
+    table = compile_shapes([parse(piece)], width + 2)
+    table = [[piece_index] + shape[1:] for piece_index, shape in enumerate(table)]
+    board_object = board_class(width, length, table, unique=False)
+    board_object.build_tables()
+    return board_object, {}
+
+
+# the boards --dedup checks, on which the shapes give each orientation its own type
+dedup_boards = {
+    "hexominos-12x12": lambda: packing_board("hexominos", 12, 12),
+    "tetrominos-6x8": lambda: packing_board("tetrominos", 6, 8),
+    "l-tetromino-4x6": lambda: orientation_board("X/X/XX", 4, 6),
+    "l-tetromino-6x8": lambda: orientation_board("X/X/XX", 6, 8),
+}
+
+
+def dedup_check(build, limit=500):
+    """
+    check that dedup.CanonicalKey gives every reflection and rotation of a packing the key of
+    the packing, for up to limit packings of the board: (packings, symmetries, different keys)
+    """
+    board_object, kwargs = build()
+    images, _ = build()
+    key = CanonicalKey(board_object)
+    symmetries = placement_symmetries(board_object)
+    # a placement by its squares, and by its piece type on a unique board
+    by_squares = {}
+    for loc, piece_indices in enumerate(board_object.placements):
+        for piece_index in piece_indices:
+            squares = tuple(sorted(placement_cells(board_object, piece_index, loc)))
+            piece = board_object.shapes[piece_index][0] if board_object.unique else None
+            by_squares.setdefault((squares, piece), (piece_index, loc))
+    packings = different = 0
+    for solution in iter_solutions(board_object, limit=limit, **kwargs):
+        digest = key.digest(board_object)
+        packings += 1
+        for symmetry in symmetries[1:]:
+            image = []
+            for piece_index, loc in solution:
+                squares = placement_cells(board_object, piece_index, loc)
+                piece = board_object.shapes[piece_index][0] if board_object.unique else None
+                image.append(by_squares[(tuple(sorted(symmetry[c] for c in squares)), piece)])
+            for piece_index, loc in image:
+                images.place_on_board(piece_index, loc)
+            different += key.digest(images) != digest
+            for piece_index, loc in reversed(image):
+                images.remove_piece_from_board(piece_index, loc)
+    return packings, len(symmetries), different
+
+
+def regressions(results, baseline, tolerance):
+    """
+    the ways results are worse than baseline: different solutions, or fewer nodes per second
+    than baseline by more than the tolerance fraction
+    """
+    found = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        old = baseline[key]
+        if (result["solutions"], result["digest"]) != (old["solutions"], old["digest"]):
+            found.append(f"{key}: found different solutions")
+        # a search over in a few milliseconds is too noisy to time
+        if old["seconds"] < 0.05:
+            continue
+        if result["nodes_per_second"] < (1 - tolerance) * old["nodes_per_second"]:
+            found.append(
+                f"{key}: {result['nodes_per_second']} nodes/s, was {old['nodes_per_second']}"
+            )
+    return found
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Time the search engines on fixed workloads.")
+    parser.add_argument(
+        "workloads",
+        nargs="*",
+        help=f"the workloads to run, from {', '.join(workloads)}, the quick ones by default",
+    )
+    parser.add_argument(
+        "--all", dest="all", action="store_true", help="run every workload"
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=sorted(engines),
+        default=["recursive", "iterative"],
+        help="the engines to compare",
+    )
+    parser.add_argument(
+        "--bitboard",
+        dest="bitboard",
+        action="store_true",
+        help="keep the board occupancy as a bitmask",
+    )
+    parser.add_argument(
+        "--repeat",
+        dest="repeat",
+        type=int,
+        default=3,
+        help="time each engine this many times and keep the fastest",
+    )
+    parser.add_argument(
+        "--save", dest="save", type=str, default="", help="write the results to this JSON file"
+    )
+    parser.add_argument(
+        "--compare",
+        dest="compare",
+        type=str,
+        default="",
+        help="a JSON file from --save to check the results against",
+    )
+    parser.add_argument(
+        "--tolerance",
+        dest="tolerance",
+        type=float,
+        default=0.2,
+        help="the drop in nodes per second --compare lets through",
+    )
+    parser.add_argument(
+        "--micro",
+        dest="micro",
+        action="store_true",
+        help="time the Board calls made at every node, and the memory they allocate, instead",
+    )
+    parser.add_argument(
+        "--parity",
+        dest="parity",
+        action="store_true",
+        help="check that _kernel.c finds the same pentomino packings as the python search, instead",
+    )
+    parser.add_argument(
+        "--dedup",
+        dest="dedup",
+        action="store_true",
+        help="check that --dedup gives the reflections and rotations of a packing its key, instead",
+    )
+    args = parser.parse_args()
+    names = args.workloads or [
+        name for name, spec in workloads.items() if args.all or spec["quick"]
+    ]
+    for name in names:
+        if name not in workloads:
+            parser.error(f"unknown workload {name}")
+
+    if args.dedup:
+        problems = 0
+        for name, build in dedup_boards.items():
+            packings, symmetries, different = dedup_check(build)
+            problems += different
+            print(
+                f"{name:16} {packings} packings, {symmetries} symmetries, "
+                f"{different} images with another key"
+            )
+        sys.exit(1 if problems else 0)
+
+    if args.parity:
+        if not kernel.available:
+            print(f"{kernel.library_path} is not built, run python kernel.py")
+            sys.exit(1)
+        same = True
+        for width, python_packings, kernel_packings in parity():
+            same = same and python_packings == kernel_packings
+            print(
+                f"width {width}: {len(python_packings)} packings in python, "
+                f"{len(kernel_packings)} in the kernel, "
+                + ("the same" if python_packings == kernel_packings else "different")
+            )
+        sys.exit(0 if same else 1)
+
+    if args.micro:
+        for workload in names:
+            result = run_micro(workload, args.repeat, args.bitboard)
+            print(f"{workload:18} board {result.pop('board_bytes')} bytes")
+            for name, call in result.items():
+                print(f"{'':18} {name:12} {call['ns']:6} ns {call['bytes']:7} bytes per call")
+        sys.exit()
+
+    results = {}
+    for workload in names:
+        digest = None
+        for engine in args.engines:
+            result = run(workload, engine, args.repeat, args.bitboard)
+            if digest is not None and result["digest"] != digest:
+                raise ValueError(f"{engine} found different solutions for {workload}")
+            digest = result["digest"]
+            results[f"{workload}/{engine}"] = result
+            first = result["first_solution"]
+            print(
+                f"{workload:18} {engine:10} {result['solutions']:6} solutions "
+                f"{result['nodes']:9} nodes {result['nodes_per_second']:7} nodes/s "
+                f"first {'-' if first is None else f'{first:.3f}'} s "
+                f"all {result['seconds']:.3f} s "
+                + (f"svg {result['svg_seconds']:.3f} s " if "svg_seconds" in result else "")
+                + (f"peak {result['peak_kb']} kB" if "peak_kb" in result else "")
+            )
+
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "bitboard": args.bitboard,
+                    "results": results,
+                },
+                fh,
+                indent=1,
+            )
+    if args.compare:
+        with open(args.compare, "r") as fh:
+            baseline = json.load(fh)
+        if baseline["bitboard"] != args.bitboard:
+            print("warning: the baseline was run with a different board")
+        problems = regressions(results, baseline["results"], args.tolerance)
+        for problem in problems:
+            print(problem)
+        if problems:
+            sys.exit(1)
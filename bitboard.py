@@ -0,0 +1,164 @@
+# bitboard.py - a Board that keeps its occupancy as an integer bitmask
+from common import Board
+
+
+class BitBoard(Board):
+    """
+    Board where the occupied squares are the set bits of one arbitrary-precision integer,
+    and each shape orientation is a mask anchored at bit 0. Testing a placement is one AND,
+    placing or removing a piece is one OR/XOR. The masks are shifted to every anchor once, in
+    build_tables, so the search does not build a new integer for every test.
+
+    The piece numbers in self.board are only painted when something reads the board,
+    so direct writes to self.board (for blocked squares) must happen before rebuild_shapes,
+    which is what builds the masks.
+    """
+
+    def __init__(self, width, length, shapes, unique=True, margin=True, debug=False):
+        self.occupied = 0
+        self.masks = []
+        # shifted[piece_index][loc] is masks[piece_index] << loc, and piece_of the piece types
+        self.shifted = []
+        self.piece_of = []
+        self.inside = 0
+        self._cells = []
+        self._painted = None
+        super().__init__(
+            width, length, shapes, unique=unique, margin=margin, debug=debug
+        )
+
+    @property
+    def board(self):
+        if not self.solution:
+            return self._cells
+        if self._painted is None:
+            painted = list(self._cells)
+            for piece_index, loc in self.solution:
+                piece = self.shapes[piece_index][0]
+                painted[loc] = piece
+                for shape_loc in self.shapes[piece_index][1:]:
+                    painted[loc + shape_loc] = piece
+            self._painted = painted
+        return self._painted
+
+    @board.setter
+    def board(self, cells):
+        self._cells = cells
+        self._painted = None
+
+    def build_tables(self):
+        super().build_tables()
+        self.occupied = 0
+        for i, cell in enumerate(self.board):
+            if cell is not None:
+                self.occupied |= 1 << i
+        self.inside = (1 << len(self.board)) - 1
+        self.masks = []
+        for shape in self.shapes:
+            mask = 1
+            for shape_loc in shape[1:]:
+                mask |= 1 << shape_loc
+            self.masks.append(mask)
+        self.shifted = [[mask << loc for loc in range(0, len(self.board))] for mask in self.masks]
+        self.piece_of = [shape[0] for shape in self.shapes]
+
+    def place_on_board(self, piece_index, loc):
+        self.used[self.piece_of[piece_index]] = True
+        self.occupied |= self.shifted[piece_index][loc]
+        self.solution.append((piece_index, loc))
+        self._painted = None
+
+    def remove_piece_from_board(self, piece_index, loc):
+        self.used[self.piece_of[piece_index]] = False
+        self.occupied ^= self.shifted[piece_index][loc]
+        sol_piece_index, sol_loc = self.solution.pop()
+        # if we didn't remove a copy of that piece from the solution, something bad happened
+        assert sol_piece_index == piece_index
+        assert sol_loc == loc
+        self._painted = None
+
+    def findloc(self):
+        # the lowest clear bit is the first empty square in row-major order
+        occupied = self.occupied
+        loc = (~occupied & (occupied + 1)).bit_length() - 1
+        if loc >= self.w2 * self.l1:
+            return None
+        return loc
+
+    def findloc_rotated(self):
+        occupied = self.occupied
+        for col in range(self.margin, self.w1):
+            for row in range(self.margin, self.l1):
+                loc = self.w2 * row + col
+                if not occupied >> loc & 1:
+                    return loc
+        return None
+
+    def frontier(self, loc):
+        return self.occupied >> loc
+
+    def test(self, loc, pattern):
+        if self.unique and self.used[self.piece_of[pattern]]:
+            return 0
+        if self.occupied & self.shifted[pattern][loc]:
+            return 0
+        return 1
+
+    def region(self, seed, free, limit=None, stop=0):
+        """
+        grow seed through the free squares until it stops growing, reaches limit squares, as
+        Board.flood counts them, or runs into stop. returns the region, and True if it stopped
+        growing, False if it reached the limit, None if it ran into stop
+        """
+        w2 = self.w2
+        while True:
+            grown = (seed | seed << 1 | seed >> 1 | seed << w2 | seed >> w2) & free
+            if grown == seed:
+                if limit is not None and bin(seed).count("1") >= limit:
+                    return seed, False
+                return seed, True
+            if grown & stop:
+                return grown, None
+            if limit is not None and bin(grown).count("1") >= limit:
+                return grown, False
+            seed = grown
+
+    def bad_colors(self, region):
+        # Board.bad_colors for a region given as a mask
+        check = self.region_check
+        if check is None:
+            return False
+        size = bin(region).count("1")
+        return not check.fits(size, 2 * bin(region & check.black).count("1") - size)
+
+    def dead_end(self, piece_index, loc):
+        # same as Board.dead_end, but grows all of a region by one step with a few shifts
+        free = ~self.occupied & self.inside
+        piece = self.shifted[piece_index][loc]
+        w2 = self.w2
+        starts = (piece << 1 | piece >> 1 | piece << w2 | piece >> w2) & free
+        border = starts
+        # the squares reached by regions that were still growing at the limit
+        partial = 0
+        big = 0
+        while border:
+            region, closed = self.region(border & -border, free, self.region_limit, partial)
+            border &= ~region
+            if closed is None:
+                partial |= region
+            elif not closed:
+                partial |= region
+                big += 1
+            elif self.bad_region(bin(region).count("1")) or self.bad_colors(region):
+                self.pruned += 1
+                return 1
+        if big < 2:
+            return 0
+        border = starts
+        while border:
+            region, _ = self.region(border & -border, free)
+            border &= ~region
+            if self.bad_region(bin(region).count("1")) or self.bad_colors(region):
+                self.pruned += 1
+                return 1
+        return 0
@@ -0,0 +1,117 @@
+# budget.py - stop a search after some solutions, seconds or nodes, and keep the deepest partial packing
+from time import perf_counter
+
+from common import Board
+from search import iter_solutions
+
+
+class OutOfBudget(Exception):
+    pass
+
+
+class Budget(object):
+    """
+    the limits of a search, and what it got to. A node is a piece placed, which every engine
+    but dlx does once per node. When a limit is reached, reason says which one, and best is
+    a copy of the packing with the most pieces seen, fill the fraction of the board it covers.
+    on_best(board_object, budget) is called with each new best still on the board
+    """
+
+    def __init__(self, solutions=None, seconds=None, nodes=None, on_best=None):
+        self.solutions = solutions
+        self.seconds = seconds
+        self.max_nodes = nodes
+        self.nodes = 0
+        self.found = 0
+        self.reason = None
+        self.best = ()
+        self.fill = 0.0
+        self.area = 0
+        self.deadline = None
+        self.start_time = None
+        self.on_best = on_best
+
+    def start(self, board_object: Board):
+        self.start_time = perf_counter()
+        if self.seconds is not None:
+            self.deadline = self.start_time + self.seconds
+        # the squares there are to fill, the pieces already on the board included
+        self.area = sum(1 for cell in board_object.board if cell is None) + sum(
+            len(board_object.shapes[piece_index]) for piece_index, _ in board_object.solution
+        )
+
+    def placing(self, board_object):
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise OutOfBudget("nodes")
+        self.nodes += 1
+        # the clock is only read every 1024 nodes
+        if self.deadline is not None and not self.nodes & 1023 and perf_counter() > self.deadline:
+            raise OutOfBudget("seconds")
+
+    def placed(self, board_object):
+        if len(board_object.solution) > len(self.best):
+            # a copy, board_object.solution keeps changing
+            self.best = tuple(board_object.solution)
+            covered = sum(len(board_object.shapes[piece_index]) for piece_index, _ in self.best)
+            self.fill = covered / self.area if self.area else 1.0
+            if self.on_best is not None:
+                self.on_best(board_object, self)
+
+    def report(self):
+        elapsed = perf_counter() - self.start_time if self.start_time is not None else 0
+        stopped = f"stopped by the {self.reason} limit" if self.reason else "finished"
+        return (
+            f"{stopped} after {self.found} solutions, {self.nodes} nodes, {elapsed:.2f} s, "
+            f"deepest packing {len(self.best)} pieces, {100 * self.fill:.1f}% full"
+        )
+
+
+class BudgetBoardMixin(object):
+    """
+    put in front of a Board class to charge every placement to self.budget
+    """
+
+    __slots__ = ()
+
+    def place_on_board(self, piece_index, loc):
+        self.budget.placing(self)
+        super().place_on_board(piece_index, loc)
+        self.budget.placed(self)
+
+
+_budgeted = {}
+
+
+def limit(board_object: Board, budget: Budget):
+    """
+    make board_object charge its placements to budget from now on
+    """
+    board_class = board_object.__class__
+    if not issubclass(board_class, BudgetBoardMixin):
+        if board_class not in _budgeted:
+            _budgeted[board_class] = type(
+                f"Budget{board_class.__name__}", (BudgetBoardMixin, board_class), {"__slots__": ()}
+            )
+        board_object.__class__ = _budgeted[board_class]
+    board_object.budget = budget
+    return board_object
+
+
+def within(board_object: Board, budget: Budget, **kwargs):
+    """
+    search.iter_solutions, taking the same keyword arguments, until the budget runs out.
+    budget.reason is None if the search finished, and the board is empty again either way
+    """
+    original = board_object.__class__
+    limit(board_object, budget)
+    budget.start(board_object)
+    try:
+        for solution in iter_solutions(board_object, limit=budget.solutions, **kwargs):
+            budget.found += 1
+            yield solution
+        if budget.solutions is not None and budget.found == budget.solutions:
+            budget.reason = "solutions"
+    except OutOfBudget as stop:
+        budget.reason = str(stop)
+    finally:
+        board_object.__class__ = original
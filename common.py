@@ -1,11 +1,13 @@
+from functools import reduce
+from hashlib import blake2b
+from math import gcd
 from time import time
 from typing import List
 
-from constraint import Problem
-from shapely.geometry import Polygon, MultiPolygon
-from shapely.ops import cascaded_union
 from svgwrite import Drawing
-from svgwrite.path import Path
+
+from polyomino import project, table_cells
+from render import solution_group
 
 
 class Board(object):
@@ -13,8 +15,19 @@ class Board(object):
     holder object so that global variables do not need to be used
     """
 
+    # no __dict__ per board, which adds up with a board in every worker process. name, stats
+    # and budget are set from outside, and subclasses that add attributes get a __dict__
+    __slots__ = (
+        "shapes", "offsets", "unique", "width", "margin", "l1", "w1", "l2", "w2", "length",
+        "board", "used", "solution", "start_time", "debug", "placements", "prune", "pruned",
+        "piece_sizes", "region_size", "region_limit", "uniform_size", "scan", "scans",
+        "region_check", "name", "stats", "budget",
+    )
+
     def __init__(self, width, length, shapes, unique=True, margin=True, debug=False):
         self.shapes = shapes
+        # the offsets of every shape after its anchor, as tuples, rebuilt by build_tables
+        self.offsets = [tuple(shape[1:]) for shape in shapes]
         # if True, there cannot be more than one copy of a piece on a board
         self.unique = unique
 
@@ -32,6 +45,20 @@ class Board(object):
         self.solution = []
         self.start_time = time()
         self.debug = debug
+        self.placements = []
+        # if True, the search drops a placement that leaves an empty region no piece set can fill
+        self.prune = False
+        self.pruned = 0
+        # with prune, a feasibility.RegionCheck that also rules out empty regions by color
+        self.region_check = None
+        self.piece_sizes = {}
+        self.region_size = 1
+        self.region_limit = 0
+        self.uniform_size = True
+        # no square before scan is empty, so findloc starts there instead of at the top,
+        # and scans holds its value from before each piece on the board was placed
+        self.scan = self.w2 + 1
+        self.scans = []
 
         if not margin:
             return
@@ -100,9 +127,7 @@ class Board(object):
         print()
 
     def board_index_to_row_col(self, board_index):
-        row = int(board_index / self.w2)
-        col = board_index % self.w2
-        return row, col
+        return divmod(board_index, self.w2)
 
     def board_row_col_to_index(self, row, col):
         return self.w2 * row + col
@@ -123,29 +148,44 @@ class Board(object):
             print(f"error: {piece_index} in {len(self.shapes)}")
         piece = self.shapes[piece_index][0]
         self.used[piece] = True
-
-        self.board[loc] = piece
-        for i in range(1, len(self.shapes[piece_index])):
-            self.board[loc + self.shapes[piece_index][i]] = piece
+        self.scans.append(self.scan)
+        if loc == self.scan:
+            self.scan = loc + 1
+
+        board = self.board
+        board[loc] = piece
+        for shape_loc in self.offsets[piece_index]:
+            board[loc + shape_loc] = piece
         self.solution.append((piece_index, loc))
 
     def remove_piece_from_board(self, piece_index, loc):
         piece = self.shapes[piece_index][0]
         self.used[piece] = False
-        self.board[loc] = None
-        for i in range(1, len(self.shapes[piece_index])):
-            self.board[loc + self.shapes[piece_index][i]] = None
+        self.scan = self.scans.pop()
+        board = self.board
+        board[loc] = None
+        for shape_loc in self.offsets[piece_index]:
+            board[loc + shape_loc] = None
         sol_piece_index, sol_loc = self.solution.pop()
         # if we didn't remove a copy of that piece from the solution, something bad happened
         assert sol_piece_index == piece_index
         assert sol_loc == loc
 
     def findloc(self):
-        for i in range(self.w2 + 1, self.w2 * self.l1 - 1):
-            if self.board[i] is None:
+        board = self.board
+        for i in range(self.scan, self.w2 * self.l1 - 1):
+            if board[i] is None:
+                self.scan = i
                 return i
+        self.scan = self.w2 * self.l1 - 1
         return None
 
+    def count_nodes(self, nodes, full=0):
+        """
+        engines that choose what to fill next without findloc report their nodes here,
+        full of them being full boards, so --stats counts every engine the same way
+        """
+
     def findloc_rotated(self):
         for col in range(self.margin, self.w1):
             for row in range(self.margin, self.l1):
@@ -156,43 +196,179 @@ class Board(object):
         return None
 
     def board_has_holes(self):
-        for i in range(self.w2 + 1, self.w2 * self.l1 - 1):
-            if self.board[i] is None:
-                row, col = self.board_index_to_row_col(i)
-                neighbors = [
-                    self.board[self.board_row_col_to_index(row + 1, col)],
-                    self.board[self.board_row_col_to_index(row - 1, col)],
-                    self.board[self.board_row_col_to_index(row, col - 1)],
-                    self.board[self.board_row_col_to_index(row, col + 1)],
-                ]
-                if all(neighbors):
-                    return 0
+        board, w2 = self.board, self.w2
+        for i in range(w2 + 1, w2 * self.l1 - 1):
+            if (
+                board[i] is None
+                and board[i + w2]
+                and board[i - w2]
+                and board[i - 1]
+                and board[i + 1]
+            ):
+                return 0
         return 1
 
     def is_hole(self, loc):
-        if self.board[loc] is not None:
+        board, w2 = self.board, self.w2
+        if board[loc] is not None:
             return 1
-        row, col = self.board_index_to_row_col(loc)
-        neighbors = [
-            self.board[self.board_row_col_to_index(row + 1, col)],
-            self.board[self.board_row_col_to_index(row - 1, col)],
-            self.board[self.board_row_col_to_index(row, col - 1)],
-            self.board[self.board_row_col_to_index(row, col + 1)],
-        ]
-        if all(neighbors):
+        if board[loc + w2] and board[loc - w2] and board[loc - 1] and board[loc + 1]:
             return 0
         return 1
 
+    def frontier(self, loc):
+        """
+        the occupied squares from loc to the end of the board, as a bitmask with loc as bit 0.
+        when the board is filled in order, everything the search still has to do depends on this
+        """
+        mask = 0
+        for i in range(loc, len(self.board)):
+            if self.board[i] is not None:
+                mask |= 1 << (i - loc)
+        return mask
+
+    def smallest_piece(self):
+        if not self.unique:
+            return min(self.piece_sizes.values())
+        sizes = [size for piece, size in self.piece_sizes.items() if not self.used[piece]]
+        return min(sizes) if sizes else len(self.board)
+
+    def bad_region(self, size):
+        if size % self.region_size:
+            return True
+        return not self.uniform_size and size < self.smallest_piece()
+
+    def bad_colors(self, seen, start, size):
+        # the region flooded from start, as seen maps it, by its checkerboard balance
+        check = self.region_check
+        if check is None:
+            return False
+        colors = check.colors
+        balance = sum(colors[square] for square, region in seen.items() if region == start)
+        return not check.fits(size, balance)
+
+    def flood(self, board, start, seen, limit=None):
+        """
+        size of the empty region around start, counting no further than limit.
+        seen maps the squares visited to the square the flood started from, and
+        if the flood runs into the squares of an earlier flood that stopped at the limit,
+        it stops and returns None
+        """
+        w2 = self.w2
+        stack = [start]
+        seen[start] = start
+        size = 0
+        while stack:
+            cell = stack.pop()
+            size += 1
+            if size == limit:
+                return size
+            for neighbor in (cell - 1, cell + 1, cell - w2, cell + w2):
+                if board[neighbor] is not None:
+                    continue
+                if neighbor not in seen:
+                    seen[neighbor] = start
+                    stack.append(neighbor)
+                elif seen[neighbor] != start:
+                    return None
+        return size
+
+    def dead_end(self, piece_index, loc):
+        """
+        flood fill the empty regions next to the piece just placed at loc, and return 1 if one
+        of them can not be filled any more, because its area is not a multiple of the piece size,
+        is smaller than the smallest piece left, or has the wrong colors for region_check.
+        A region bigger than region_limit is only measured when there are two of them: the
+        regions further away were checked when they were made, so the area left on the board
+        makes a single big region a multiple as well.
+        needs the margin around the board
+        """
+        board = self.board
+        w2 = self.w2
+        squares = [loc] + [loc + k for k in self.offsets[piece_index]]
+        starts = [
+            start
+            for square in squares
+            for start in (square - 1, square + 1, square - w2, square + w2)
+            if board[start] is None
+        ]
+        seen = {}
+        big = 0
+        for start in starts:
+            if start in seen:
+                continue
+            size = self.flood(board, start, seen, self.region_limit)
+            if size is None:
+                continue
+            if size == self.region_limit:
+                big += 1
+            elif self.bad_region(size) or self.bad_colors(seen, start, size):
+                self.pruned += 1
+                return 1
+        if big < 2:
+            return 0
+        seen = {}
+        for start in starts:
+            if start in seen:
+                continue
+            size = self.flood(board, start, seen)
+            if self.bad_region(size) or self.bad_colors(seen, start, size):
+                self.pruned += 1
+                return 1
+        return 0
+
     def test(self, loc, pattern):
-        piece = self.shapes[pattern][0]
-        if self.used[piece] and self.unique:
+        if self.unique and self.used[self.shapes[pattern][0]]:
             return 0
-        for shape_loc in self.shapes[pattern][1:]:
-            if self.board[loc + shape_loc] is not None:
+        board = self.board
+        for shape_loc in self.offsets[pattern]:
+            if board[loc + shape_loc] is not None:
                 return 0
         # we also want to make sure that the board does not contain any empty islands
         return 1
 
+    def build_tables(self):
+        """
+        called by rebuild_shapes once the shape offsets have been scaled to the board width,
+        subclasses hook in here to precompute anything that depends on the shapes
+        """
+        self.offsets = [tuple(shape[1:]) for shape in self.shapes]
+        self.placements = self.build_placements()
+        self.piece_sizes = {shape[0]: len(shape) for shape in self.shapes}
+        self.region_size = reduce(gcd, self.piece_sizes.values())
+        self.uniform_size = len(set(self.piece_sizes.values())) == 1
+        self.region_limit = 2 * max(self.piece_sizes.values())
+
+    def build_placements(self):
+        """
+        for every anchor square, the shapes that stay inside the board and off any
+        blocked squares, so the search never tests a piece that hangs over the margin
+        """
+        placements = [[] for _ in range(0, len(self.board))]
+        for loc, cell in enumerate(self.board):
+            if cell is not None:
+                continue
+            for piece_index, shape in enumerate(self.shapes):
+                for shape_loc in shape[1:]:
+                    if (
+                        loc + shape_loc >= len(self.board)
+                        or self.board[loc + shape_loc] is not None
+                    ):
+                        break
+                else:
+                    placements[loc].append(piece_index)
+        return placements
+
+    def candidates(self, loc, first_piece=0):
+        """
+        the shapes that fit at loc now, in the order the search tries them
+        """
+        return [
+            piece_index
+            for piece_index in self.placements[loc]
+            if piece_index >= first_piece and self.test(loc, piece_index)
+        ]
+
     def print_shapes(self):
         self.print_board_locations()
         for shape in self.shapes:
@@ -208,7 +384,9 @@ class Board(object):
             else self.solution
         )
 
-        return hash(",".join(str(piece_type) for piece_type, _ in solution))
+        # the same in every process, and different for different placements
+        text = ",".join(f"{piece_index}@{loc}" for piece_index, loc in solution)
+        return blake2b(text.encode(), digest_size=8).hexdigest()
 
     @staticmethod
     def from_str(input_str: str, width: int, length: int, shapes: List[List[int]]):
@@ -223,82 +401,14 @@ class Board(object):
 
 
 def rebuild_shapes(board_object: Board):
+    # the hand-written tables are on an 8 wide grid, move them onto the board
     for shape in board_object.shapes:
-        for j in range(1, len(shape)):
-            k = shape[j]
-            if board_object.margin:
-                k += 3
-            row = int(k / 8)
-            col = k % 8
-            if board_object.margin:
-                col -= 3
-            k = board_object.w2 * row + col
-            shape[j] = k
+        shape[1:] = project(table_cells(shape, board_object.margin), board_object.w2)
+    board_object.build_tables()
 
 
 def output_to_svg(board_object, multicolor=True):
-    square_size = 40
-    margin = 4
     filename = f"{board_object.name}w{board_object.width}_{board_object.hash()}.svg"
     drawing = Drawing(filename)
-    colors = [
-        "blueviolet",
-        "brown",
-        "burlywood",
-        "cadetblue",
-        "chartreuse",
-        "chocolate",
-        "coral",
-        "cornflowerblue",
-        "cornsilk",
-        "crimson",
-        "cyan",
-        "darkblue",
-        "darkcyan",
-        "darkgoldenrod",
-    ]
-    pieces = []
-
-    for piece_index, loc in board_object.solution:
-        polygons = []
-        for square_loc in [0] + board_object.shapes[piece_index][1:]:
-            board_loc = loc + square_loc
-            row, col = board_object.board_index_to_row_col(board_loc)
-            rect_points = [
-                (square_size * row, square_size * col),
-                (square_size * (row + 1), square_size * col),
-                (square_size * (row + 1), square_size * (col + 1)),
-                (square_size * row, square_size * (col + 1)),
-            ]
-            polygons.append(Polygon(rect_points))
-        polygon = cascaded_union(polygons)
-        pieces.append(polygon)
-    if multicolor:
-        # get a coloring for the shapes solving the four color problem as a CSP
-        problem = Problem()
-        for i in range(len(pieces)):
-            problem.addVariable(i, [0, 1, 2, 3])
-            for j in range(len(pieces)):
-                if i == j:
-                    continue
-                if pieces[i].intersects(pieces[j]):
-                    problem.addConstraint(lambda x, y: x != y, (i, j))
-        # there should always be at least one solution
-        coloring_solution = problem.getSolution()
-    else:
-        coloring_solution = [0 for _ in range(len(pieces))]
-    for i, piece in enumerate(pieces):
-        if isinstance(piece, MultiPolygon):
-            raise ValueError(
-                f"bad solution! {board_object.solution}, a piece was probably placed off the edge of the board"
-            )
-
-        piece_points = piece.buffer(-margin).exterior.coords
-        d = f"M {piece_points[0][0]} {piece_points[0][1]} "
-        for x, y in piece_points[1:]:
-            d += f"L {x} {y} "
-        shape_index = board_object.solution[i][0]
-        _id = f"{shape_index}_{board_object.shapes[shape_index][0]}"
-        drawing.add(Path(d=d, fill=colors[int(coloring_solution[i])], id=_id))
-
+    drawing.add(solution_group(board_object, multicolor=multicolor))
     drawing.save(pretty=2)
@@ -0,0 +1,225 @@
+# dedup.py - a canonical key for each packing under the board's symmetries, and a set of keys kept mostly on disk
+import heapq
+import mmap
+import os
+import sys
+from array import array
+from glob import glob
+from hashlib import blake2b
+from time import time_ns
+
+from common import Board
+from symmetry import placement_cells, placement_symmetries
+
+KEY_SIZE = 16
+
+
+class CanonicalKey(object):
+    """
+    the same key for a packing and all its reflections and rotations. The board is read
+    square by square in the order each symmetry maps it to, every piece is numbered by the
+    first square it covers in that order, and the smallest of these readings is the key.
+    On a board that is not unique the tables give each orientation its own piece type, so
+    the types are left out and the squares of each piece say what it is.
+    Call before any piece is placed
+    """
+
+    def __init__(self, board_object: Board):
+        self.cells = [square for square, cell in enumerate(board_object.board) if cell is None]
+        self.unique = board_object.unique
+        self.orders = []
+        for symmetry in placement_symmetries(board_object):
+            inverse = [0] * len(symmetry)
+            for square, image in enumerate(symmetry):
+                inverse[image] = square
+            # the squares as they come in reading the image of the board
+            self.orders.append([inverse[square] for square in self.cells])
+
+    def grid(self, board_object: Board):
+        """
+        the canonical reading, a tuple of piece numbers by square followed, on a unique board,
+        by the piece types by number, empty squares being piece 0 with type -1
+        """
+        owner = [0] * len(board_object.board)
+        types = [-1]
+        for number, (piece_index, loc) in enumerate(board_object.solution, 1):
+            for square in placement_cells(board_object, piece_index, loc):
+                owner[square] = number
+            types.append(board_object.shapes[piece_index][0])
+        best = None
+        for order in self.orders:
+            labels = {0: 0}
+            reading = []
+            for number in [owner[square] for square in order]:
+                label = labels.get(number)
+                if label is None:
+                    label = labels[number] = len(labels)
+                reading.append(label)
+            if self.unique:
+                by_label = sorted(labels, key=labels.get)
+                reading.extend(types[number] for number in by_label)
+            reading = tuple(reading)
+            if best is None or reading < best:
+                best = reading
+        return best
+
+    def digest(self, board_object: Board):
+        """
+        the canonical reading hashed to KEY_SIZE bytes, the same on every machine
+        """
+        words = array("i", self.grid(board_object))
+        if sys.byteorder == "big":
+            words.byteswap()
+        return blake2b(words.tobytes(), digest_size=KEY_SIZE).digest()
+
+
+class BloomFilter(object):
+    """
+    bits bits, and hashes positions per key taken from the key itself, which is a hash already
+    """
+
+    def __init__(self, bits=1 << 27, hashes=7):
+        self.bits = bits
+        self.hashes = hashes
+        self.array = bytearray((bits + 7) // 8)
+
+    def _positions(self, key):
+        h1 = int.from_bytes(key[:8], "little")
+        h2 = int.from_bytes(key[8:16], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.array[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def _keys(run):
+    for offset in range(0, len(run), KEY_SIZE):
+        yield run[offset : offset + KEY_SIZE]
+
+
+def _in_run(run, key):
+    lo, hi = 0, len(run) // KEY_SIZE
+    while lo < hi:
+        mid = (lo + hi) // 2
+        found = run[mid * KEY_SIZE : (mid + 1) * KEY_SIZE]
+        if found == key:
+            return True
+        if found < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return False
+
+
+class KeyStore(object):
+    """
+    a set of keys that holds at most buffer_size of them in memory. A full buffer is sorted
+    and written to directory as a run, a file of sorted keys that lookups bisect through an
+    mmap, and a Bloom filter over every key lets most new keys skip the runs. Runs already in
+    directory, from an earlier session, count as seen, so a resumed search does not count a
+    packing twice. Processes working at the same time should each add to their own store in
+    one directory, distinct_keys(directory) merges them in the end
+    """
+
+    def __init__(self, directory, buffer_size=1 << 20, bloom_bits=1 << 27, hashes=7, max_runs=16):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.max_runs = max_runs
+        self.buffer = set()
+        self.bloom = BloomFilter(bloom_bits, hashes)
+        # filename -> mmap, and the runs this store wrote, which it may merge
+        self.runs = {}
+        self.own = []
+        self.added = 0
+        for filename in sorted(glob(os.path.join(directory, "*.keys"))):
+            run = self._open(filename)
+            for key in _keys(run):
+                self.bloom.add(key)
+
+    def _open(self, filename):
+        with open(filename, "rb") as fh:
+            self.runs[filename] = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.runs[filename]
+
+    def __contains__(self, key):
+        if key not in self.bloom:
+            return False
+        return key in self.buffer or any(_in_run(run, key) for run in self.runs.values())
+
+    def add(self, key):
+        """
+        add key, true if it was not there before
+        """
+        if key in self:
+            return False
+        self.bloom.add(key)
+        self.buffer.add(key)
+        self.added += 1
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+        return True
+
+    def _write(self, keys):
+        filename = os.path.join(self.directory, f"{os.getpid()}-{time_ns()}.keys")
+        # written under another name first, so a run is complete or not there at all
+        with open(filename + ".tmp", "wb") as fh:
+            for key in keys:
+                fh.write(key)
+        os.replace(filename + ".tmp", filename)
+        self._open(filename)
+        self.own.append(filename)
+
+    def flush(self):
+        if self.buffer:
+            self._write(sorted(self.buffer))
+            self.buffer = set()
+        if len(self.own) > self.max_runs:
+            self.compact()
+
+    def compact(self):
+        """
+        merge the runs this store wrote into one
+        """
+        old = self.own
+        self.own = []
+        self._write(heapq.merge(*(_keys(self.runs[filename]) for filename in old)))
+        for filename in old:
+            self.runs.pop(filename).close()
+            os.remove(filename)
+
+    def close(self):
+        self.flush()
+        for run in self.runs.values():
+            run.close()
+        self.runs = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def distinct_keys(directory):
+    """
+    every key in the runs in directory once, in order, whichever store wrote them
+    """
+    runs = []
+    for filename in sorted(glob(os.path.join(directory, "*.keys"))):
+        with open(filename, "rb") as fh:
+            if os.fstat(fh.fileno()).st_size:
+                runs.append(mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ))
+    last = None
+    try:
+        for key in heapq.merge(*(_keys(run) for run in runs)):
+            if key != last:
+                yield key
+                last = key
+    finally:
+        for run in runs:
+            run.close()
@@ -0,0 +1,183 @@
+# dlx.py - Knuth's Dancing Links (Algorithm X) as an exact cover backend for a Board
+from common import Board
+
+
+class DancingLinks(object):
+    """
+    sparse exact cover matrix kept as parallel arrays of left/right/up/down links.
+    node 0 is the root, nodes 1 to columns are the column headers, and the columns
+    numbered below primary must be covered exactly once, the rest at most once
+    """
+
+    def __init__(self, columns, primary, rows):
+        self.left = [i - 1 for i in range(0, columns + 1)]
+        self.right = [i + 1 for i in range(0, columns + 1)]
+        self.left[0] = primary
+        self.right[primary] = 0
+        # secondary columns are not linked into the header list, so they are never chosen
+        for column in range(primary + 1, columns + 1):
+            self.left[column] = self.right[column] = column
+        self.up = list(range(0, columns + 1))
+        self.down = list(range(0, columns + 1))
+        self.column = list(range(0, columns + 1))
+        self.size = [0 for _ in range(0, columns + 1)]
+        self.row = [-1 for _ in range(0, columns + 1)]
+        # the calls to search, a node for --stats as a call to findloc is in search.solutions
+        self.nodes = 0
+
+        for row_number, row_columns in enumerate(rows):
+            first = len(self.column)
+            for column in row_columns:
+                node = len(self.column)
+                self.column.append(column)
+                self.row.append(row_number)
+                self.up.append(self.up[column])
+                self.down.append(column)
+                self.down[self.up[column]] = node
+                self.up[column] = node
+                self.size[column] += 1
+                self.left.append(node - 1)
+                self.right.append(node + 1)
+            self.left[first] = len(self.column) - 1
+            self.right[len(self.column) - 1] = first
+
+    def cover(self, column):
+        left, right, up, down = self.left, self.right, self.up, self.down
+        columns, size = self.column, self.size
+        right[left[column]] = right[column]
+        left[right[column]] = left[column]
+        i = down[column]
+        while i != column:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[columns[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def uncover(self, column):
+        left, right, up, down = self.left, self.right, self.up, self.down
+        columns, size = self.column, self.size
+        i = up[column]
+        while i != column:
+            j = left[i]
+            while j != i:
+                size[columns[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[column]] = column
+        left[right[column]] = column
+
+    def search(self, chosen=None):
+        """
+        yield the row numbers of every exact cover, always branching on the
+        primary column with the fewest remaining rows. cover and uncover are nearly all of
+        the time, see -x in Readme.md
+        """
+        if chosen is None:
+            chosen = []
+        self.nodes += 1
+        right, down = self.right, self.down
+        if right[0] == 0:
+            yield chosen
+            return
+        best = column = right[0]
+        while column:
+            if self.size[column] < self.size[best]:
+                best = column
+            column = right[column]
+        if not self.size[best]:
+            return
+
+        self.cover(best)
+        i = down[best]
+        while i != best:
+            chosen.append(self.row[i])
+            j = right[i]
+            while j != i:
+                self.cover(self.column[j])
+                j = right[j]
+            yield from self.search(chosen)
+            j = self.left[i]
+            while j != i:
+                self.uncover(self.column[j])
+                j = self.left[j]
+            chosen.pop()
+            i = down[i]
+        self.uncover(best)
+
+
+def exact_cover(board_object: Board, skip=None, first_piece=0):
+    """
+    build the cell x piece matrix for the empty squares of the board. There is a column
+    for every empty square, and on a unique board one for every unused piece.
+    shapes before first_piece get no rows, as in search.solutions, and
+    skip(board_object, loc, piece_index) can veto placements, e.g. for symmetry breaking.
+    returns the matrix and the (piece_index, loc) placement each row stands for
+    """
+    cells = [i for i, cell in enumerate(board_object.board) if cell is None]
+    cell_columns = {loc: i + 1 for i, loc in enumerate(cells)}
+    piece_columns = {}
+    piece_area = 0
+    if board_object.unique:
+        for shape in board_object.shapes[first_piece:]:
+            if board_object.used[shape[0]] or shape[0] in piece_columns:
+                continue
+            piece_columns[shape[0]] = len(cells) + len(piece_columns) + 1
+            piece_area += len(shape)
+    # the pieces have to be covered exactly once only if together they fill the board
+    primary = len(cells)
+    if piece_area == len(cells):
+        primary += len(piece_columns)
+
+    rows = []
+    placements = []
+    for loc in cells:
+        for piece_index in board_object.placements[loc]:
+            shape = board_object.shapes[piece_index]
+            if piece_index < first_piece or not board_object.test(loc, piece_index):
+                continue
+            if skip is not None and skip(board_object, loc, piece_index):
+                continue
+            row = [cell_columns[loc]] + [cell_columns[loc + k] for k in shape[1:]]
+            if board_object.unique:
+                row.append(piece_columns[shape[0]])
+            rows.append(row)
+            placements.append((piece_index, loc))
+    columns = len(cells) + len(piece_columns)
+    return DancingLinks(columns, primary, rows), placements
+
+
+def dancing_links(board_object: Board, skip=None, first_piece=0):
+    """
+    fill the rest of the board with Algorithm X. Every time the board is full the
+    pieces are placed on board_object, so board_object.solution, print_board and
+    output_to_svg all work as with place(), and the board object is yielded
+    """
+    links, placements = exact_cover(board_object, skip=skip, first_piece=first_piece)
+    counted = 0
+    try:
+        for chosen in links.search():
+            board_object.count_nodes(links.nodes - counted, 1)
+            counted = links.nodes
+            for row in chosen:
+                board_object.place_on_board(*placements[row])
+            yield board_object
+            for row in reversed(chosen):
+                board_object.remove_piece_from_board(*placements[row])
+    finally:
+        board_object.count_nodes(links.nodes - counted)
+
+
+def fill_with_dlx(first_piece=0):
+    """
+    a fill function for search.iter_solutions that never places the shapes before first_piece
+    """
+
+    def fill(board_object, skip=None):
+        return dancing_links(board_object, skip=skip, first_piece=first_piece)
+
+    return fill
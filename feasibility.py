@@ -0,0 +1,145 @@
+# feasibility.py - rule out boards the pieces cannot fill by counting squares, before any search
+from common import Board
+
+# the colorings tried after the checkerboard: squares whose row, column, or diagonal is r mod k
+patterns = {
+    "row": lambda row, col: row,
+    "column": lambda row, col: col,
+    "row + column": lambda row, col: row + col,
+    "row - column": lambda row, col: row - col,
+}
+
+
+def colorings(moduli=(2, 3, 4)):
+    """
+    (name, k, weights) for every coloring, weights[row % k][col % k] being what a square
+    counts for. The checkerboard comes first
+    """
+    yield "parity", 2, [[-1, 1], [1, -1]]
+    for k in moduli:
+        for expression, pattern in patterns.items():
+            for r in range(0, k):
+                weights = [
+                    [int(pattern(row, col) % k == r) for col in range(0, k)] for row in range(0, k)
+                ]
+                yield f"coloring {expression} mod {k} = {r}", k, weights
+
+
+def checkerboard(board_object: Board):
+    """
+    1 for the black squares and -1 for the white ones, by board index
+    """
+    return [
+        1 if sum(board_object.board_index_to_row_col(square)) % 2 else -1
+        for square in range(0, len(board_object.board))
+    ]
+
+
+def placement_sums(board_object: Board, k, weights):
+    """
+    for every piece that fits somewhere, its size and the totals of the weights it can cover.
+    A placement's total only depends on its anchor mod k, so one anchor of each is enough
+    """
+    w2 = board_object.w2
+    anchors = {}
+    for loc, piece_indices in enumerate(board_object.placements):
+        row, col = divmod(loc, w2)
+        for piece_index in piece_indices:
+            anchors.setdefault((piece_index, row % k, col % k), loc)
+    sums = {}
+    for (piece_index, _, _), loc in anchors.items():
+        shape = board_object.shapes[piece_index]
+        total = 0
+        for square in [loc] + [loc + offset for offset in shape[1:]]:
+            row, col = divmod(square, w2)
+            total += weights[row % k][col % k]
+        size, totals = sums.setdefault(shape[0], (len(shape), set()))
+        totals.add(total)
+    return sums
+
+
+def reachable(sums, area, unique, bound):
+    """
+    the totals the pieces can make covering exactly area squares, each piece at most once
+    if unique, as a bitmask with bit bound + t set for total t. reach[covered] is the same
+    for fewer squares, and the shifts are kept in range by masking to 2 * bound + 1 bits
+    """
+    mask = (1 << (2 * bound + 1)) - 1
+    reach = [0] * (area + 1)
+    reach[0] = 1 << bound
+
+    def shifted(bits, total):
+        return (bits << total if total >= 0 else bits >> -total) & mask
+
+    if unique:
+        for size, totals in sums.values():
+            for covered in range(area, size - 1, -1):
+                if reach[covered - size]:
+                    for total in totals:
+                        reach[covered] |= shifted(reach[covered - size], total)
+        return reach
+    kinds = set((size, total) for size, totals in sums.values() for total in totals)
+    for covered in range(1, area + 1):
+        for size, total in kinds:
+            if size <= covered and reach[covered - size]:
+                reach[covered] |= shifted(reach[covered - size], total)
+    return reach
+
+
+def infeasible(board_object: Board, moduli=(2, 3, 4)):
+    """
+    why the empty squares of board_object cannot be packed, or None if no check rules it out.
+    "area" if no set of pieces has their number of squares, "parity" if none covers as many
+    black and white squares as the board has, and "coloring ..." for the first coloring of
+    the board that no set of pieces matches square for square. Call before any piece is placed
+    """
+    empty = [square for square, cell in enumerate(board_object.board) if cell is None]
+    area = len(empty)
+    w2 = board_object.w2
+    for name, k, weights in colorings(moduli):
+        sums = placement_sums(board_object, k, weights)
+        if board_object.unique and sum(size for size, _ in sums.values()) < area:
+            return "area"
+        target = 0
+        for square in empty:
+            row, col = divmod(square, w2)
+            target += weights[row % k][col % k]
+        bound = area * max(abs(weight) for line in weights for weight in line)
+        reach = reachable(sums, area, board_object.unique, bound)
+        if not reach[area]:
+            return "area"
+        if not reach[area] >> (bound + target) & 1:
+            return name
+    return None
+
+
+class RegionCheck(object):
+    """
+    Board.region_check, so the search with --prune also drops a placement that leaves an
+    empty region no pieces can cover by checkerboard color. A region needs pieces with its
+    number of squares and its balance of black and white squares, from all of the pieces on a
+    unique board, as the region does not know which are used. colors are the squares' colors
+    as checkerboard gives them, and black has a bit set for each black square, for BitBoard
+    """
+
+    def __init__(self, board_object: Board):
+        self.colors = checkerboard(board_object)
+        self.black = sum(1 << square for square, color in enumerate(self.colors) if color > 0)
+        area = sum(1 for cell in board_object.board if cell is None)
+        self.bound = area
+        sums = placement_sums(board_object, 2, [[-1, 1], [1, -1]])
+        # either sign, a region can be anywhere
+        for size, totals in sums.values():
+            totals.update([-total for total in totals])
+        self.reach = reachable(sums, area, False, area)
+
+    def fits(self, size, balance):
+        return self.reach[size] >> (self.bound + balance) & 1
+
+
+def check_regions(board_object: Board):
+    """
+    have the search with --prune check the colors of the regions it leaves, as well as their size
+    """
+    board_object.region_check = RegionCheck(board_object)
+    return board_object
@@ -1,9 +1,28 @@
 # hexsol.py  - a translation of Karl Dahlke's polyomino packing program to python
 # not for commercial use
+import sys
 from argparse import ArgumentParser
 
 # lay out shapes on an 8x8 board.
+from archive import ArchiveWriter, board_header
+from bitboard import BitBoard
 from common import Board, rebuild_shapes, output_to_svg
+from dlx import dancing_links
+from feasibility import check_regions, infeasible
+from instrument import SearchStats, instrument
+from iterative import IterativeSearch
+import kernel
+from parallel import parallel_search, split
+
+try:
+    from numpyboard import NumpyBoard
+except ImportError:
+    # numpy is optional, it is only needed for --numpy
+    NumpyBoard = None
+from render import SheetWriter
+from search import count_solutions, iter_solutions
+from strategy import fill_with, strategies
+from symmetry import SymmetryBreaker, distinct_solutions
 
 shapes = [
     [0, 7, 8, 9, 16],
@@ -89,61 +108,120 @@ cross_all = [
 # position the cross, and go
 def cross(board_object, top, nsols):
     board_object.place_on_board(piece_index=0, loc=top)
-    nsols = place(board_object, nsols=nsols)
+    if args.dlx:
+        nsols = place_exact_cover(board_object, nsols=nsols)
+    else:
+        nsols = place(board_object, nsols=nsols)
 
     board_object.remove_piece_from_board(piece_index=0, loc=top)
     return nsols
 
 
+# some checks for symmetry for odd dimensions
+def skip_symmetric(board_object, loc, piece_index):
+    return loc == 21 and board_object.width == 3 and shapes[piece_index][0] == 8
+
+
+# which reflections are already counted, for the i-th position of the cross
+def centers(width, i):
+    # width = 3 handled in skip_symmetric()
+    lcenter = wcenter = ocenter = 0
+    if width == 4 and i == 5:
+        lcenter = 1
+    if width == 5 and not (i & 1):
+        wcenter = 1
+    if width == 8 and i == 2:
+        ocenter = 1
+    return lcenter, wcenter, ocenter
+
+
+# a full board that is a reflection of a board that is counted elsewhere
+def is_reflection(board_object):
+    # the cross is always the first piece placed
+    top = board_object.solution[0][1]
+    lcenter, wcenter, ocenter = centers(
+        board_object.width, cross_all[board_object.width - 3].index(top)
+    )
+    return (
+        (wcenter and board_object.wflip())
+        or (lcenter and board_object.lflip())
+        or (ocenter and board_object.board[13] > board_object.board[31])
+    )
+
+
+# count a full board, unless it is a reflection of a board that is counted elsewhere
+def record_solution(board_object, nsols):
+    if is_reflection(board_object):
+        #  skip this one
+        return nsols
+    nsols += 1
+    show_solution(board_object, nsols)
+    return nsols
+
+
+def show_solution(board_object, nsols):
+    if args.svg:
+        output_to_svg(board_object)
+    if sheet is not None:
+        sheet.add(board_object)
+    if archive is not None:
+        archive.add(board_object)
+    #  print solution
+    if args.dispflag:
+        print(f"solution {nsols}: ")
+        board_object.print_board()
+
+
 # place a piece in the board; recursive
 def place(board_object, nsols):
     # find best location
     loc = board_object.findloc()
     if not loc:
-        return  # square that no piece fits into
+        return nsols  # square that no piece fits into
 
-    piece_index = 1
-    while piece_index < len(shapes):
-        piece_type = shapes[piece_index][0]
-        if not board_object.test(loc, piece_index):
-            piece_index += 1
+    for piece_index in board_object.placements[loc]:
+        # the cross is placed by cross()
+        if piece_index < 1 or not board_object.test(loc, piece_index):
             continue
 
-        # some checks for symmetry for odd dimensions
-        if loc == 21 and args.width == 3 and piece_type == 8:
-            piece_index += 1
+        if skip_symmetric(board_object, loc, piece_index):
             continue
 
         #  place the piece
         piece = shapes[piece_index][0]
 
         board_object.place_on_board(loc=loc, piece_index=piece_index)
+        if board_object.prune and board_object.dead_end(piece_index, loc):
+            board_object.remove_piece_from_board(piece_index, loc)
+            continue
         if args.debug:
             print(
                 f"placing piece {piece}[{piece_index}] at square {loc}, used {sum(used)}"
             )
 
         if all(board_object.used):
-            if (
-                (wcenter and board_object.wflip())
-                or (lcenter and board_object.lflip())
-                or (ocenter and board_object.board[13] > board_object.board[31])
-            ):
-                #  skip this one
-                pass
-            else:
-                nsols += 1
-                if args.svg:
-                    output_to_svg(board_object, nsols)
-                #  print solution
-                if args.dispflag:
-                    print(f"solution {nsols}: ")
-                    board_object.print_board()
+            nsols = record_solution(board_object, nsols)
         else:
             nsols = place(board_object, nsols)
         #  remove piece
         board_object.remove_piece_from_board(piece_index, loc)
-        piece_index += 1
+    return nsols
+
+
+# fill the rest of the board as an exact cover problem, branching on the most constrained
+# square or piece instead of the first empty square
+def place_exact_cover(board_object, nsols):
+    for _ in dancing_links(board_object, skip=skip_symmetric):
+        nsols = record_solution(board_object, nsols)
+    return nsols
+
+
+# break the symmetry with the symmetry module instead of the cross_all table
+def place_symmetric(board_object, breaker, nsols):
+    fill = dancing_links if args.dlx else None
+    for _ in distinct_solutions(board_object, breaker, fill=fill):
+        nsols += 1
+        show_solution(board_object, nsols)
     return nsols
 
 
@@ -169,10 +247,146 @@ if __name__ == "__main__":
     parser.add_argument(
         "-s", dest="svg", action="store_true", help="save solution as svg"
     )
+    parser.add_argument(
+        "--sheet",
+        dest="sheet",
+        type=str,
+        default="",
+        help="draw the solutions into paginated svg files with this prefix",
+    )
+    parser.add_argument(
+        "--per-page",
+        dest="per_page",
+        type=int,
+        default=100,
+        help="number of solutions on each --sheet page, 0 for one sheet",
+    )
+    parser.add_argument(
+        "--archive",
+        dest="archive",
+        type=str,
+        default="",
+        help="append the solutions to this binary archive",
+    )
+    parser.add_argument(
+        "-n",
+        "--numpy",
+        dest="numpy",
+        action="store_true",
+        help="keep a NumPy copy of the board to fit many shapes at once, needs numpy",
+    )
+    parser.add_argument(
+        "-b",
+        "--bitboard",
+        dest="bitboard",
+        action="store_true",
+        help="keep the board occupancy as a bitmask, which searches faster",
+    )
+    parser.add_argument(
+        "-x",
+        "--dlx",
+        dest="dlx",
+        action="store_true",
+        help="solve as an exact cover problem with dancing links",
+    )
+    parser.add_argument(
+        "-o",
+        "--order",
+        dest="order",
+        choices=sorted(strategies),
+        default="first",
+        help="fill the first empty square, or the one the fewest placements can cover",
+    )
+    parser.add_argument(
+        "-i",
+        "--iterative",
+        dest="iterative",
+        action="store_true",
+        help="search with an explicit stack instead of recursion",
+    )
+    parser.add_argument(
+        "-k",
+        "--kernel",
+        dest="kernel",
+        action="store_true",
+        help="run the search in _kernel.c if it is built, see kernel.py",
+    )
+    parser.add_argument(
+        "--stats",
+        dest="stats",
+        type=str,
+        default="",
+        help="write search counters as JSON lines to this file, - for the screen",
+    )
+    parser.add_argument(
+        "--stats-every",
+        dest="stats_every",
+        type=int,
+        default=100000,
+        help="number of search nodes between --stats lines",
+    )
+    parser.add_argument(
+        "-r",
+        "--prune",
+        dest="prune",
+        action="store_true",
+        help="drop placements that leave an empty region no set of pieces can fill",
+    )
+    parser.add_argument(
+        "-g",
+        "--symmetry",
+        dest="symmetry",
+        action="store_true",
+        help="work out the symmetries of the board instead of using the cross_all table",
+    )
+    parser.add_argument(
+        "-p",
+        "--parallel",
+        dest="parallel",
+        action="store_true",
+        help="search the positions of the cross in a pool of processes",
+    )
+    parser.add_argument(
+        "--processes",
+        dest="processes",
+        type=int,
+        default=None,
+        help="number of processes for -p, defaults to one per core",
+    )
+    parser.add_argument(
+        "--split-depth",
+        dest="split_depth",
+        type=int,
+        default=1,
+        help="number of pieces after the cross that -p places before handing out work",
+    )
 
     args = parser.parse_args()
+    if args.prune and args.dlx:
+        # dlx never puts a piece on the board before the packing is complete
+        parser.error("-r does not prune -x, which backs up at the first square nothing covers")
+    if args.prune and args.kernel:
+        parser.error("_kernel.c does not prune, leave out -k to search with -r")
+    if args.kernel and not kernel.available:
+        print(
+            f"warning: {kernel.library_path} is not built, searching in python instead, "
+            "python kernel.py builds it"
+        )
     l = 8 if args.width == 8 else int(60 / args.width)
-    _board = Board(args.width, l, shapes)
+    board_class = BitBoard if args.bitboard else Board
+    if args.numpy:
+        if NumpyBoard is None:
+            parser.error("--numpy needs numpy installed")
+        board_class = NumpyBoard
+    _board = board_class(args.width, l, shapes)
+    _board.name = "pentominos"
+    sheet = None
+    if args.sheet:
+        sheet = SheetWriter(args.sheet, per_page=args.per_page or None)
+    _board.prune = args.prune
+    if args.stats:
+        stats_stream = sys.stdout if args.stats == "-" else open(args.stats, "w")
+        instrument(_board, SearchStats(every=args.stats_every, stream=stats_stream))
 
     if args.width == 8:
         _board.board[10 * 5 + 5] = 26
@@ -182,24 +396,86 @@ if __name__ == "__main__":
 
     # scale the location of the shapes based on the board width
     rebuild_shapes(_board)
+    reason = infeasible(_board)
+    if reason is not None:
+        print(f"no packing of {args.width}x{l}, ruled out by {reason}")
+        if args.countflag:
+            print("0 solutions\n")
+        sys.exit()
+    if args.prune:
+        check_regions(_board)
+    archive = None
+    if args.archive:
+        archive = ArchiveWriter(args.archive, board_header(_board, "pentominos"))
     cross_pos = cross_all[args.width - 3]
 
     nsols = 0
 
-    i = 0
-
-    # only for debugging
-    while cross_pos[i]:
-        # args.width = 3 handled in place()
-        lcenter = wcenter = ocenter = 0
-        if args.width == 4 and i == 5:
-            lcenter = 1
-        if args.width == 5 and not (i & 1):
-            wcenter = 1
-        if args.width == 8 and i == 2:
-            ocenter = 1
-        cross(_board, top=cross_pos[i], nsols=nsols)
-        i += 1
+    skip, reject = skip_symmetric, is_reflection
+    # every cross position is split further by the first placements after it
+    roots = [((0, top),) for top in cross_pos if top]
+    if args.symmetry:
+        breaker = SymmetryBreaker(_board)
+        skip, reject = None, breaker.is_duplicate
+        roots = breaker.roots()
+
+    if args.parallel:
+        prefixes = split(_board, args.split_depth, roots=roots, skip=skip)
+        for _, count, found in parallel_search(
+            _board,
+            prefixes,
+            processes=args.processes,
+            skip=skip,
+            reject=reject,
+            keep_solutions=args.dispflag or args.svg or args.sheet or args.archive,
+        ):
+            if not found:
+                nsols += count
+            for solution in found:
+                for piece_index, loc in solution:
+                    _board.place_on_board(piece_index, loc)
+                nsols += 1
+                show_solution(_board, nsols)
+                for piece_index, loc in reversed(solution):
+                    _board.remove_piece_from_board(piece_index, loc)
+    elif args.order != "first":
+        for _ in iter_solutions(
+            _board, roots=roots, skip=skip, reject=reject, fill=fill_with(args.order)
+        ):
+            nsols += 1
+            show_solution(_board, nsols)
+    elif args.kernel:
+        for _ in iter_solutions(
+            _board, roots=roots, skip=skip, reject=reject, fill=kernel.fill_with_kernel()
+        ):
+            nsols += 1
+            show_solution(_board, nsols)
+    elif args.countflag and not (
+        args.dispflag or args.svg or args.sheet or args.archive or args.dlx or args.debug
+    ):
+        # only the total is wanted
+        nsols = count_solutions(_board, roots=roots, skip=skip, reject=reject)
+    elif args.iterative:
+        search = IterativeSearch(_board, roots=roots, skip=skip, reject=reject)
+        for _ in search.solutions():
+            nsols += 1
+            show_solution(_board, nsols)
+    elif args.symmetry:
+        nsols = place_symmetric(_board, breaker, nsols)
+    else:
+        i = 0
+        # only for debugging
+        while cross_pos[i]:
+            nsols = cross(_board, top=cross_pos[i], nsols=nsols)
+            i += 1
 
+    if sheet is not None:
+        sheet.close()
+    if archive is not None:
+        archive.close()
     if args.countflag:
         print(f"{nsols} solutions\n")
+        if args.prune and not args.parallel:
+            print(f"{_board.pruned} placements pruned")
+    if args.stats:
+        _board.stats.report()
@@ -0,0 +1,181 @@
+# instrument.py - count what a search does to its board, and report on it as it goes
+import json
+from time import perf_counter
+
+from bitboard import BitBoard
+from common import Board
+
+
+class SearchStats(object):
+    """
+    counters for a search, filled in by an instrumented board.
+    a node is a call to findloc, which every backtracking engine makes once per node, or a
+    choice of what to fill next reported by Board.count_nodes in the engines that do not.
+    placed[d] and seconds[d] are the placements made at depth d (the number of pieces on the
+    board after placing) and the time spent below them. Every `every` nodes, callback(stats)
+    is called and a JSON line of the counters is written to stream, if they are given
+    """
+
+    def __init__(self, every=100000, callback=None, stream=None):
+        self.every = every
+        self.callback = callback
+        self.stream = stream
+        self.start_time = perf_counter()
+        self.nodes = 0
+        self.full = 0
+        self.tests = 0
+        self.rejected = 0
+        self.pruned = 0
+        self.placed = []
+        self.seconds = []
+        self.started = []
+
+    def placing(self, depth):
+        while len(self.placed) < depth:
+            self.placed.append(0)
+            self.seconds.append(0.0)
+        self.placed[depth - 1] += 1
+        self.started.append(perf_counter())
+
+    def removing(self, depth):
+        if self.started:
+            self.seconds[depth - 1] += perf_counter() - self.started.pop()
+
+    def node(self, depth, nodes=1):
+        before = self.nodes
+        self.nodes += nodes
+        if self.every and self.nodes // self.every != before // self.every:
+            self.report(depth)
+
+    def __getstate__(self):
+        # sent to pool workers without the reporting, they send their counters back to merge
+        state = dict(self.__dict__)
+        state["callback"] = state["stream"] = None
+        return state
+
+    def merge(self, other):
+        self.nodes += other.nodes
+        self.full += other.full
+        self.tests += other.tests
+        self.rejected += other.rejected
+        self.pruned += other.pruned
+        while len(self.placed) < len(other.placed):
+            self.placed.append(0)
+            self.seconds.append(0.0)
+        for depth in range(0, len(other.placed)):
+            self.placed[depth] += other.placed[depth]
+            self.seconds[depth] += other.seconds[depth]
+
+    def as_dict(self, depth=None):
+        elapsed = perf_counter() - self.start_time
+        return {
+            "elapsed": round(elapsed, 3),
+            "nodes": self.nodes,
+            "nodes_per_second": round(self.nodes / elapsed) if elapsed else 0,
+            "depth": depth,
+            "full_boards": self.full,
+            "tests": self.tests,
+            "rejected": self.rejected,
+            "pruned": self.pruned,
+            "placed": self.placed,
+            "seconds": [round(seconds, 3) for seconds in self.seconds],
+        }
+
+    def report(self, depth=None):
+        if self.callback is not None:
+            self.callback(self)
+        if self.stream is not None:
+            self.stream.write(json.dumps(self.as_dict(depth)) + "\n")
+            self.stream.flush()
+
+
+class InstrumentedBoardMixin(object):
+    """
+    put in front of a Board class to count calls into self.stats
+    """
+
+    # no attributes of its own, so a Board can switch to the instrumented class and back
+    __slots__ = ()
+
+    def findloc(self):
+        loc = super().findloc()
+        self.stats.node(len(self.solution))
+        if loc is None:
+            self.stats.full += 1
+        return loc
+
+    def count_nodes(self, nodes, full=0):
+        self.stats.node(len(self.solution), nodes)
+        self.stats.full += full
+
+    def test(self, loc, pattern):
+        self.stats.tests += 1
+        if super().test(loc, pattern):
+            return 1
+        self.stats.rejected += 1
+        return 0
+
+    def place_on_board(self, piece_index, loc):
+        super().place_on_board(piece_index, loc)
+        self.stats.placing(len(self.solution))
+
+    def remove_piece_from_board(self, piece_index, loc):
+        self.stats.removing(len(self.solution))
+        super().remove_piece_from_board(piece_index, loc)
+
+    def dead_end(self, piece_index, loc):
+        if super().dead_end(piece_index, loc):
+            self.stats.pruned += 1
+            return 1
+        return 0
+
+
+class InstrumentedBoard(InstrumentedBoardMixin, Board):
+    __slots__ = ()
+
+
+class InstrumentedBitBoard(InstrumentedBoardMixin, BitBoard):
+    __slots__ = ()
+
+
+class NodeCountingBoardMixin(object):
+    """
+    put in front of a Board class to count only the nodes and full boards into self.stats,
+    for timing a search with as little as can be in its way
+    """
+
+    __slots__ = ()
+
+    def findloc(self):
+        loc = super().findloc()
+        self.stats.nodes += 1
+        if loc is None:
+            self.stats.full += 1
+        return loc
+
+    def count_nodes(self, nodes, full=0):
+        self.stats.nodes += nodes
+        self.stats.full += full
+
+
+_instrumented = {
+    (InstrumentedBoardMixin, Board): InstrumentedBoard,
+    (InstrumentedBoardMixin, BitBoard): InstrumentedBitBoard,
+}
+
+
+def instrument(board_object: Board, stats: SearchStats, mixin=InstrumentedBoardMixin):
+    """
+    make board_object count into stats from now on, whatever engine searches it.
+    mixin=NodeCountingBoardMixin counts the nodes and full boards only
+    """
+    board_class = board_object.__class__
+    if (mixin, board_class) not in _instrumented:
+        _instrumented[(mixin, board_class)] = type(
+            mixin.__name__.replace("BoardMixin", "") + board_class.__name__,
+            (mixin, board_class),
+            {"__slots__": ()},
+        )
+    board_object.__class__ = _instrumented[(mixin, board_class)]
+    board_object.stats = stats
+    return board_object
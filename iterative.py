@@ -0,0 +1,204 @@
+# iterative.py - the backtracking search with an explicit stack, so it can be saved and resumed
+import json
+import os
+from operator import length_hint
+from time import time
+
+from common import Board
+
+
+class IterativeSearch(object):
+    """
+    the same search as search.solutions, in the same order, but the state lives in three
+    arrays allocated up front instead of the Python call stack, so there is no recursion limit
+    and the search can be saved and picked up again. It is no faster: a node makes the same
+    Board calls as in search.solutions. Frame d is locs[d], the empty square being filled,
+    shapes[d], an iterator over the rest of the placements[loc] to try, and
+    pieces[d], the shape on that square now. Every frame but the last has its shape on the
+    board, so the frames and the root are all a checkpoint needs.
+
+    with checkpoint set to a filename, the state is written there every checkpoint_every
+    seconds, and whenever request_checkpoint() is called, e.g. from a signal handler
+    """
+
+    def __init__(
+        self,
+        board_object: Board,
+        roots=((),),
+        first_piece=0,
+        skip=None,
+        reject=None,
+        checkpoint=None,
+        checkpoint_every=600,
+        header=None,
+    ):
+        self.board_object = board_object
+        self.roots = list(roots)
+        self.first_piece = first_piece
+        self.skip = skip
+        self.reject = reject
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        # saved with the checkpoint, e.g. to check the board is the same on resume
+        self.header = header or {}
+        # the shapes before first_piece are dropped once here rather than at every node
+        self.placements = [
+            [piece_index for piece_index in piece_indices if piece_index >= first_piece]
+            for piece_indices in board_object.placements
+        ]
+        # every piece covers a square, so there are never more frames than squares
+        size = len(board_object.board) + 1
+        self.locs = [0] * size
+        self.shapes = [None] * size
+        self.pieces = [0] * size
+        self.depth = 0
+        self.root = 0
+        self.count = 0
+        self.nodes = 0
+        self.elapsed = 0.0
+        self.stop_requested = False
+        self.save_requested = False
+
+    def request_checkpoint(self, stop=False):
+        self.save_requested = True
+        self.stop_requested = self.stop_requested or stop
+
+    @property
+    def stack(self):
+        # each frame as [loc, the position in placements[loc] of the next shape to try]
+        placements = self.placements
+        return [
+            [loc, len(placements[loc]) - length_hint(shapes)]
+            for loc, shapes in zip(self.locs[: self.depth], self.shapes)
+        ]
+
+    def state(self):
+        return {
+            "header": self.header,
+            "root": self.root,
+            "stack": self.stack,
+            "solution": self.board_object.solution,
+            "count": self.count,
+            "nodes": self.nodes,
+            "elapsed": self.elapsed,
+        }
+
+    def save(self, filename):
+        # write to a new file and move it over, so a crash mid-write leaves the old checkpoint
+        with open(filename + ".tmp", "w") as fh:
+            json.dump(self.state(), fh)
+        os.replace(filename + ".tmp", filename)
+
+    def resume(self, state):
+        """
+        put the board back the way it was when state was saved, the board must be empty
+        """
+        self.root = state["root"]
+        self.count = state["count"]
+        self.nodes = state["nodes"]
+        self.elapsed = state["elapsed"]
+        board_object = self.board_object
+        if self.root < len(self.roots):
+            for piece_index, loc in self.roots[self.root]:
+                board_object.place_on_board(piece_index, loc)
+        self.depth = len(state["stack"])
+        for d, (loc, position) in enumerate(state["stack"]):
+            self.locs[d] = loc
+            self.shapes[d] = iter(self.placements[loc][position:])
+            if d < self.depth - 1:
+                self.pieces[d] = self.placements[loc][position - 1]
+                board_object.place_on_board(self.pieces[d], loc)
+        if [list(placement) for placement in board_object.solution] != [
+            list(placement) for placement in state["solution"]
+        ]:
+            raise ValueError("the checkpoint does not match this board")
+
+    def solutions(self):
+        """
+        yield board_object every time the board is full, like search.solutions,
+        until the search is finished or stop is requested
+        """
+        # everything the inner loop touches is a local
+        board_object = self.board_object
+        placements = self.placements
+        findloc = board_object.findloc
+        test = board_object.test
+        place = board_object.place_on_board
+        remove = board_object.remove_piece_from_board
+        prune, dead_end = board_object.prune, board_object.dead_end
+        skip, reject = self.skip, self.reject
+        locs, shapes, pieces = self.locs, self.shapes, self.pieces
+        checkpoint = self.checkpoint
+        depth, count, nodes = self.depth, self.count, self.nodes
+        started = last_save = time()
+        elapsed = self.elapsed
+        while self.root < len(self.roots):
+            root = self.roots[self.root]
+            if not depth:
+                for piece_index, loc in root:
+                    place(piece_index, loc)
+                nodes += 1
+                loc = findloc()
+                if loc is None:
+                    # the root filled the board
+                    if reject is None or not reject(board_object):
+                        self.count = count = count + 1
+                        yield board_object
+                else:
+                    locs[0], shapes[0], depth = loc, iter(placements[loc]), 1
+            while depth:
+                if checkpoint is not None and (
+                    self.save_requested
+                    or (not nodes % 1000 and time() - last_save > self.checkpoint_every)
+                ):
+                    self.depth, self.count, self.nodes = depth, count, nodes
+                    self.elapsed = elapsed + time() - started
+                    self.save(checkpoint)
+                    self.save_requested = False
+                    last_save = time()
+                    if self.stop_requested:
+                        return
+
+                top = depth - 1
+                loc = locs[top]
+                for piece_index in shapes[top]:
+                    if not test(loc, piece_index):
+                        continue
+                    if skip is not None and skip(board_object, loc, piece_index):
+                        continue
+                    place(piece_index, loc)
+                    if prune and dead_end(piece_index, loc):
+                        remove(piece_index, loc)
+                        continue
+                    break
+                else:
+                    # nothing else fits here, back up to the square before
+                    depth = top
+                    if depth:
+                        remove(pieces[top - 1], locs[top - 1])
+                    continue
+                pieces[top] = piece_index
+                nodes += 1
+                next_loc = findloc()
+                if next_loc is not None:
+                    locs[depth] = next_loc
+                    shapes[depth] = iter(placements[next_loc])
+                    depth += 1
+                    continue
+                if reject is None or not reject(board_object):
+                    self.depth, self.count, self.nodes = depth, count + 1, nodes
+                    count += 1
+                    yield board_object
+                remove(piece_index, loc)
+            for piece_index, loc in reversed(root):
+                remove(piece_index, loc)
+            self.root += 1
+        self.depth, self.count, self.nodes = depth, count, nodes
+        self.elapsed = elapsed + time() - started
+        if checkpoint is not None:
+            self.save(checkpoint)
+
+
+def load_checkpoint(filename):
+    with open(filename, "r") as fh:
+        return json.load(fh)
@@ -0,0 +1,169 @@
+# kernel.py - search.solutions with its inner loop in C, when _kernel.c has been built
+import ctypes
+import os
+import subprocess
+import sys
+import sysconfig
+from array import array
+
+from common import Board
+import search
+
+library_path = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "_kernel" + (sysconfig.get_config_var("SHLIB_SUFFIX") or ".so"),
+)
+
+
+def _load():
+    try:
+        lib = ctypes.CDLL(library_path)
+    except OSError:
+        # not built, or built for another machine: the pure python search is used instead
+        return None
+    lib.next_solution.restype = ctypes.c_int
+    lib.next_solution.argtypes = (
+        [ctypes.c_void_p, ctypes.c_int]
+        + [ctypes.c_void_p] * 6
+        + [ctypes.c_int]
+        + [ctypes.c_void_p] * 5
+    )
+    return lib
+
+
+# run as a script, this module builds the library, and the check below loads it on import
+_lib = None if __name__ == "__main__" else _load()
+available = _lib is not None
+
+
+def build():
+    """
+    compile _kernel.c next to this file with the compiler python was built with
+    """
+    source = os.path.join(os.path.dirname(library_path), "_kernel.c")
+    compiler = (sysconfig.get_config_var("CC") or "cc").split()
+    # a library another process has loaded is replaced, not written over
+    subprocess.run(
+        compiler + ["-O2", "-shared", "-fPIC", "-o", library_path + ".tmp", source], check=True
+    )
+    os.replace(library_path + ".tmp", library_path)
+
+
+def _address(buffer):
+    return ctypes.addressof(ctypes.c_char.from_buffer(buffer))
+
+
+class Kernel(object):
+    """
+    the board as it is and the placements that may follow, as the flat arrays next_solution
+    in _kernel.c works on. skip is asked once per placement here, so it must only depend on
+    the placement, as hexsol.skip_symmetric does
+    """
+
+    def __init__(self, board_object: Board, first_piece=0, skip=None):
+        self.board = array("i", [cell is not None for cell in board_object.board])
+        self.end = board_object.w2 * board_object.l1 - 1
+        self.offsets = array("i")
+        self.offset_start = array("i", [0])
+        for offsets in board_object.offsets:
+            self.offsets.extend(offsets)
+            self.offset_start.append(len(self.offsets))
+        # an empty array has no address to hand over
+        self.offsets.append(0)
+        self.piece_of = array("i", [shape[0] for shape in board_object.shapes])
+        self.candidates = array("i")
+        self.candidate_start = array("i", [0])
+        for loc, piece_indices in enumerate(board_object.placements):
+            for piece_index in piece_indices:
+                if piece_index < first_piece:
+                    continue
+                if skip is not None and skip(board_object, loc, piece_index):
+                    continue
+                self.candidates.append(piece_index)
+            self.candidate_start.append(len(self.candidates))
+        self.candidates.append(0)
+        self.used = bytearray(board_object.used)
+        self.unique = int(board_object.unique)
+        depth = self.board.count(0) + 1
+        self.locs = array("i", [0] * depth)
+        self.positions = array("i", [0] * depth)
+        self.placed = array("i", [0] * depth)
+        self.state = array("i", [0, 0])
+        self.nodes = ctypes.c_longlong(0)
+
+    def next_solution(self):
+        """
+        the (piece_index, loc) placements of the next packing, or None when there are no more
+        """
+        depth = _lib.next_solution(
+            _address(self.board),
+            self.end,
+            _address(self.offsets),
+            _address(self.offset_start),
+            _address(self.piece_of),
+            _address(self.candidates),
+            _address(self.candidate_start),
+            _address(self.used),
+            self.unique,
+            _address(self.locs),
+            _address(self.positions),
+            _address(self.placed),
+            _address(self.state),
+            ctypes.addressof(self.nodes),
+        )
+        if depth < 0:
+            return None
+        return tuple(zip(self.placed[:depth], self.locs[:depth]))
+
+
+def solutions(board_object: Board, first_piece=0, skip=None):
+    """
+    search.solutions, with the search run by _kernel.c, which only puts each packing on
+    board_object while it is yielded. Without the kernel, or with --prune, which it does not
+    do, this is search.solutions
+    """
+    if _lib is None or board_object.prune:
+        yield from search.solutions(board_object, first_piece, skip)
+        return
+    kernel = Kernel(board_object, first_piece, skip)
+    counted = 0
+    while True:
+        placements = kernel.next_solution()
+        # the findloc calls made in C, counted for --stats as search.solutions counts its own
+        board_object.count_nodes(kernel.nodes.value - counted, placements is not None)
+        counted = kernel.nodes.value
+        if placements is None:
+            return
+        for piece_index, loc in placements:
+            board_object.place_on_board(piece_index, loc)
+        yield board_object
+        for piece_index, loc in reversed(placements):
+            board_object.remove_piece_from_board(piece_index, loc)
+
+
+def fill_with_kernel(first_piece=0):
+    """
+    a fill function for search.iter_solutions, roots, skip and reject are used as they are
+    """
+
+    def fill(board_object, skip=None):
+        return solutions(board_object, first_piece, skip)
+
+    return fill
+
+
+if __name__ == "__main__":
+    build()
+    print(f"built {library_path}", file=sys.stderr)
+    # benchmark imports this module again, which loads the new library
+    import benchmark
+
+    same = True
+    for width, python_packings, kernel_packings in benchmark.parity():
+        same = same and python_packings == kernel_packings
+        print(
+            f"width {width}: {len(kernel_packings)} packings, "
+            f"python found {len(python_packings)}"
+        )
+    if not same:
+        sys.exit(f"{library_path} does not find the packings the python search finds")
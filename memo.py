@@ -0,0 +1,81 @@
+# memo.py - count packings by caching the count for every state of the fill, transfer-matrix style
+from collections import OrderedDict
+
+from common import Board
+
+
+class MemoCounter(object):
+    """
+    counts the packings of a board like search.count_solutions, but remembers the count for each
+    state it has finished. The board is always filled from its first empty square, so the state
+    is that square, the squares taken from it on (Board.frontier), and the pieces used on a unique
+    board. Many branches reach the same state, above all when pieces may be used more than once.
+
+    at most maxsize counts are kept, the least recently used ones are dropped first.
+    skip(board_object, loc, piece_index) may only look at loc and piece_index, and there is no
+    reject, since a cached count can not depend on the rest of the board
+    """
+
+    def __init__(self, board_object: Board, maxsize=1 << 20, first_piece=0, skip=None):
+        self.board_object = board_object
+        self.maxsize = maxsize
+        self.first_piece = first_piece
+        self.skip = skip
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def count(self, roots=((),)):
+        board_object = self.board_object
+        count = 0
+        for root in roots:
+            for piece_index, loc in root:
+                board_object.place_on_board(piece_index, loc)
+            count += self._count()
+            for piece_index, loc in reversed(root):
+                board_object.remove_piece_from_board(piece_index, loc)
+        return count
+
+    def _count(self):
+        board_object = self.board_object
+        loc = board_object.findloc()
+        if loc is None:
+            return 1
+        used = 0
+        if board_object.unique:
+            for piece, piece_used in enumerate(board_object.used):
+                if piece_used:
+                    used |= 1 << piece
+        key = (loc, board_object.frontier(loc), used)
+        cache = self.cache
+        if key in cache:
+            self.hits += 1
+            cache.move_to_end(key)
+            return cache[key]
+        self.misses += 1
+
+        count = 0
+        for piece_index in board_object.placements[loc]:
+            if piece_index < self.first_piece or not board_object.test(loc, piece_index):
+                continue
+            if self.skip is not None and self.skip(board_object, loc, piece_index):
+                continue
+            board_object.place_on_board(piece_index, loc)
+            if not (board_object.prune and board_object.dead_end(piece_index, loc)):
+                count += self._count()
+            board_object.remove_piece_from_board(piece_index, loc)
+
+        cache[key] = count
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False)
+            self.evictions += 1
+        return count
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return (
+            f"{self.hits} cache hits, {self.misses} misses "
+            f"({100 * self.hits / lookups if lookups else 0:.1f}% hits), "
+            f"{self.evictions} evictions, {len(self.cache)} states cached"
+        )
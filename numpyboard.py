@@ -0,0 +1,93 @@
+# numpyboard.py - a Board that also keeps its occupancy in a NumPy array, to fit many shapes at once
+import numpy as np
+
+from common import Board
+
+
+class NumpyBoard(Board):
+    """
+    Board with a uint8 copy of the occupancy in self.grid, and the shape offsets as one
+    int array, so every shape at an anchor, or every shape at every anchor, is checked
+    with a single gather. The per-node search still uses Board.test, which is faster than
+    NumPy for one shape at a time; the vectorized checks are for building the placement
+    tables and for the wide first levels that parallel.split hands out. Writing to the grid
+    at every node would cost more than the checks save, so place_on_board leaves it alone
+    and the checks bring it up to date first, with the placements made since the last one.
+    """
+
+    def __init__(self, width, length, shapes, unique=True, margin=True, debug=False):
+        self.grid = None
+        self.offset_matrix = None
+        # the placements on the grid
+        self.synced = []
+        self.piece_types = None
+        self.anchors = []
+        super().__init__(
+            width, length, shapes, unique=unique, margin=margin, debug=debug
+        )
+
+    def build_placements(self):
+        size = len(self.board)
+        cell_count = max(len(shape) for shape in self.shapes)
+        # a shape with fewer squares repeats its anchor, which checks and writes the same square
+        self.offset_matrix = np.zeros((len(self.shapes), cell_count), dtype=np.int64)
+        for piece_index, shape in enumerate(self.shapes):
+            self.offset_matrix[piece_index, 1 : len(shape)] = shape[1:]
+        self.piece_types = np.array([shape[0] for shape in self.shapes], dtype=np.int64)
+        self.grid = np.array([cell is not None for cell in self.board], dtype=np.uint8)
+        self.synced = list(self.solution)
+
+        # every anchor against every shape, squares off the end of the board count as taken
+        cells = np.arange(size)[:, None, None] + self.offset_matrix[None, :, :]
+        outside = (cells < 0) | (cells >= size)
+        taken = self.grid[np.clip(cells, 0, size - 1)].astype(bool) | outside
+        fits = ~taken.any(axis=2) & (self.grid == 0)[:, None]
+        self.anchors = [np.flatnonzero(row) for row in fits]
+        return [row.tolist() for row in self.anchors]
+
+    def _squares(self, placements):
+        piece_indices = np.array([piece_index for piece_index, _ in placements], dtype=np.int64)
+        locs = np.array([loc for _, loc in placements], dtype=np.int64)
+        return (locs[:, None] + self.offset_matrix[piece_indices]).ravel()
+
+    def sync_grid(self):
+        """
+        clear the squares of the placements taken off since the grid was last brought up to
+        date and fill those of the ones made, each with one scatter
+        """
+        synced, solution = self.synced, self.solution
+        same = 0
+        while same < min(len(synced), len(solution)) and synced[same] == solution[same]:
+            same += 1
+        if same < len(synced):
+            self.grid[self._squares(synced[same:])] = 0
+        if same < len(solution):
+            self.grid[self._squares(solution[same:])] = 1
+        self.synced = list(solution)
+
+    def _fitting(self, locs, piece_indices):
+        # which (loc, piece_index) pairs land on empty squares with a piece that is still free
+        self.sync_grid()
+        fits = ~self.grid[locs[:, None] + self.offset_matrix[piece_indices]].any(axis=1)
+        if self.unique:
+            fits &= ~np.array(self.used, dtype=bool)[self.piece_types[piece_indices]]
+        return fits
+
+    def candidates(self, loc, first_piece=0):
+        piece_indices = self.anchors[loc]
+        if first_piece:
+            piece_indices = piece_indices[piece_indices >= first_piece]
+        locs = np.full(len(piece_indices), loc)
+        return piece_indices[self._fitting(locs, piece_indices)].tolist()
+
+    def all_candidates(self, first_piece=0):
+        """
+        every (piece_index, loc) that fits anywhere on the board now, by square then shape
+        """
+        self.sync_grid()
+        locs = np.repeat(np.arange(len(self.anchors)), [len(row) for row in self.anchors])
+        piece_indices = np.concatenate(self.anchors)
+        keep = (piece_indices >= first_piece) & (self.grid[locs] == 0)
+        locs, piece_indices = locs[keep], piece_indices[keep]
+        fits = self._fitting(locs, piece_indices)
+        return list(zip(piece_indices[fits].tolist(), locs[fits].tolist()))
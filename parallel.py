@@ -0,0 +1,116 @@
+# parallel.py - split the search tree into independent prefixes and farm them out to a process pool
+from multiprocessing import Pool
+from os import cpu_count
+
+from common import Board
+from search import count_solutions, solutions
+
+# set in each worker by _init_worker, the board is sent once per worker rather than once per task
+_worker = {}
+
+
+def split(board_object: Board, depth, roots=((),), first_piece=0, skip=None):
+    """
+    extend each root prefix by the placements of the next depth levels of the serial search.
+    a prefix is a tuple of (piece_index, loc) placements, and the prefixes come out in the
+    order the serial search would visit them
+    """
+    prefixes = []
+    for root in roots:
+        for piece_index, loc in root:
+            board_object.place_on_board(piece_index, loc)
+        _extend(board_object, depth, first_piece, skip, list(root), prefixes)
+        for piece_index, loc in reversed(root):
+            board_object.remove_piece_from_board(piece_index, loc)
+    return prefixes
+
+
+def _extend(board_object, depth, first_piece, skip, prefix, prefixes):
+    loc = board_object.findloc()
+    if not depth or loc is None:
+        prefixes.append(tuple(prefix))
+        return
+    # the first levels branch the widest, so all the shapes that fit are found in one go
+    for piece_index in board_object.candidates(loc, first_piece):
+        if skip is not None and skip(board_object, loc, piece_index):
+            continue
+        board_object.place_on_board(piece_index, loc)
+        if board_object.prune and board_object.dead_end(piece_index, loc):
+            board_object.remove_piece_from_board(piece_index, loc)
+            continue
+        prefix.append((piece_index, loc))
+        _extend(board_object, depth - 1, first_piece, skip, prefix, prefixes)
+        prefix.pop()
+        board_object.remove_piece_from_board(piece_index, loc)
+
+
+def _init_worker(board_object, first_piece, skip, reject, keep_solutions):
+    _worker["board"] = board_object
+    _worker["first_piece"] = first_piece
+    _worker["skip"] = skip
+    _worker["reject"] = reject
+    _worker["keep_solutions"] = keep_solutions
+
+
+def _solve_prefix(prefix):
+    board_object = _worker["board"]
+    reject = _worker["reject"]
+    for piece_index, loc in prefix:
+        board_object.place_on_board(piece_index, loc)
+    stats = getattr(board_object, "stats", None)
+    if stats is not None:
+        # split counted the placements of the prefix and its last node already
+        full = board_object.findloc() is None
+        # count each prefix on its own, the counters are merged back in the main process
+        board_object.stats = stats.__class__(every=0)
+    count = 0
+    found = []
+    if _worker["keep_solutions"]:
+        for _ in solutions(board_object, _worker["first_piece"], _worker["skip"]):
+            if reject is not None and reject(board_object):
+                continue
+            count += 1
+            found.append(tuple(board_object.solution))
+    else:
+        count = count_solutions(
+            board_object,
+            first_piece=_worker["first_piece"],
+            skip=_worker["skip"],
+            reject=reject,
+        )
+    if stats is not None:
+        board_object.stats.nodes -= 1
+        board_object.stats.full -= full
+    for piece_index, loc in reversed(prefix):
+        board_object.remove_piece_from_board(piece_index, loc)
+    return count, found, getattr(board_object, "stats", None)
+
+
+def parallel_search(
+    board_object: Board,
+    prefixes,
+    processes=None,
+    first_piece=0,
+    skip=None,
+    reject=None,
+    keep_solutions=True,
+):
+    """
+    solve every prefix in a pool of processes, one for every core by default. Each worker
+    pulls the next prefix as soon as it is idle, so a few slow subtrees do not hold up the rest.
+    yields (prefix, number of solutions, solutions) in the order of prefixes, whatever order
+    the workers finish in, so the results are the same as for the serial search.
+    reject(board_object) can drop full boards, e.g. reflections of boards counted elsewhere.
+    skip and reject are sent to the workers, so they have to be module level functions
+    """
+    with Pool(
+        processes=processes or cpu_count(),
+        initializer=_init_worker,
+        initargs=(board_object, first_piece, skip, reject, keep_solutions),
+    ) as pool:
+        for prefix, (count, found, stats) in zip(
+            prefixes, pool.imap(_solve_prefix, prefixes, chunksize=1)
+        ):
+            if stats is not None:
+                board_object.stats.merge(stats)
+            yield prefix, count, found
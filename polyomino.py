@@ -0,0 +1,80 @@
+# polyomino.py - compile pieces given as sets of squares into the offset tables the boards use
+from functools import lru_cache
+
+
+def parse(text):
+    """
+    the squares of a piece drawn in text, one row per line (or per /), any character but
+    space or . is a square. parse("XXX/X") is the L tetromino
+    """
+    return frozenset(
+        (row, col)
+        for row, line in enumerate(text.replace("/", "\n").splitlines())
+        for col, char in enumerate(line)
+        if char not in " ."
+    )
+
+
+def normalize(cells):
+    """
+    the squares relative to the anchor, the first square in row-major order,
+    as a tuple in row-major order
+    """
+    anchor = min(cells)
+    return tuple(sorted((row - anchor[0], col - anchor[1]) for row, col in cells))
+
+
+@lru_cache(maxsize=None)
+def orientations(cells, reflections=True):
+    """
+    the distinct rotations of a piece, and of its mirror image if reflections, each normalized.
+    The piece as given comes first
+    """
+    found = []
+    current = list(cells)
+    for flip in (False, True) if reflections else (False,):
+        if flip:
+            current = [(row, -col) for row, col in cells]
+        for _ in range(0, 4):
+            shape = normalize(current)
+            if shape not in found:
+                found.append(shape)
+            current = [(col, -row) for row, col in current]
+    return tuple(found)
+
+
+@lru_cache(maxsize=None)
+def project(shape, w2):
+    """
+    the board offsets of the squares of a normalized shape after the anchor,
+    on a board w2 squares wide, margin included
+    """
+    return tuple(w2 * row + col for row, col in shape[1:])
+
+
+def compile_shapes(pieces, w2, reflections=True):
+    """
+    a shape table for pieces, a list of sets of squares: one row per orientation of each
+    piece, the piece number followed by its offsets on a board w2 squares wide
+    """
+    table = []
+    for piece, cells in enumerate(pieces):
+        for shape in orientations(frozenset(cells), reflections):
+            table.append([piece] + list(project(shape, w2)))
+    return table
+
+
+def table_cells(shape, margin=True):
+    """
+    the squares of a row of a hand-written shape table, whose offsets are on an 8 wide grid
+    with the anchor in column 3 when there is a margin
+    """
+    cells = [(0, 0)]
+    for k in shape[1:]:
+        if margin:
+            k += 3
+        row, col = divmod(k, 8)
+        if margin:
+            col -= 3
+        cells.append((row, col))
+    return tuple(cells)
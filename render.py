@@ -0,0 +1,197 @@
+# render.py - draw packings as svg, straight from the squares of the board
+from svgwrite import Drawing
+from svgwrite.container import Group
+from svgwrite.path import Path
+
+colors = [
+    "blueviolet",
+    "brown",
+    "burlywood",
+    "cadetblue",
+    "chartreuse",
+    "chocolate",
+    "coral",
+    "cornflowerblue",
+    "cornsilk",
+    "crimson",
+    "cyan",
+    "darkblue",
+    "darkcyan",
+    "darkgoldenrod",
+]
+
+
+def outlines(board_object):
+    """
+    one pass over the squares of the pieces in board_object.solution. Returns the outline of
+    each piece, as a list of loops of (row, col) corners going counterclockwise, and the set
+    of pieces next to each piece, both indexed by position in the solution
+    """
+    w2 = board_object.w2
+    owner = {}
+    for i, (piece_index, loc) in enumerate(board_object.solution):
+        for k in [0] + board_object.shapes[piece_index][1:]:
+            owner[loc + k] = i
+    edges = [{} for _ in board_object.solution]
+    adjacent = [set() for _ in board_object.solution]
+    for square, i in owner.items():
+        row, col = board_object.board_index_to_row_col(square)
+        # the four sides of the square, each with the square on the other side of it
+        for start, end, neighbour in (
+            ((row, col), (row + 1, col), square - 1),
+            ((row + 1, col), (row + 1, col + 1), square + w2),
+            ((row + 1, col + 1), (row, col + 1), square + 1),
+            ((row, col + 1), (row, col), square - w2),
+        ):
+            other = owner.get(neighbour)
+            if other == i:
+                continue
+            if other is not None:
+                adjacent[i].add(other)
+            edges[i].setdefault(start, []).append(end)
+    return [_loops(piece_edges) for piece_edges in edges], adjacent
+
+
+def _loops(edges):
+    # chain the sides into closed loops, keeping only the corners where the outline turns
+    loops = []
+    while edges:
+        start = next(iter(edges))
+        loop = [start]
+        point = start
+        while True:
+            ends = edges[point]
+            end = ends.pop()
+            if not ends:
+                del edges[point]
+            if end == start:
+                break
+            loop.append(end)
+            point = end
+        corners = [
+            point
+            for before, point, after in zip(loop[-1:] + loop[:-1], loop, loop[1:] + loop[:1])
+            if (point[0] - before[0], point[1] - before[1]) != (after[0] - point[0], after[1] - point[1])
+        ]
+        loops.append(corners)
+    return loops
+
+
+def _area(loop):
+    return sum(
+        x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(loop, loop[1:] + loop[:1])
+    )
+
+
+def inset(loop, margin):
+    """
+    move every side of a loop of corners margin towards the inside of the piece
+    """
+    points = []
+    for before, point, after in zip(loop[-1:] + loop[:-1], loop, loop[1:] + loop[:1]):
+        # the sides are at right angles, so each corner moves along both inward normals
+        dx1, dy1 = _sign(point[0] - before[0]), _sign(point[1] - before[1])
+        dx2, dy2 = _sign(after[0] - point[0]), _sign(after[1] - point[1])
+        points.append(
+            (point[0] - margin * (dy1 + dy2), point[1] + margin * (dx1 + dx2))
+        )
+    return points
+
+
+def _sign(value):
+    return (value > 0) - (value < 0)
+
+
+def greedy_coloring(adjacent):
+    """
+    give each piece the first color none of the pieces next to it already has
+    """
+    coloring = []
+    for i, others in enumerate(adjacent):
+        taken = {coloring[j] for j in others if j < i}
+        color = 0
+        while color in taken:
+            color += 1
+        coloring.append(color)
+    return coloring
+
+
+def solution_group(board_object, multicolor=True, square_size=40, margin=4):
+    """
+    the pieces of the packing on board_object as paths in an svg group
+    """
+    loops, adjacent = outlines(board_object)
+    coloring = greedy_coloring(adjacent) if multicolor else [0] * len(loops)
+    group = Group()
+    for i, piece_loops in enumerate(loops):
+        if sum(1 for loop in piece_loops if _area(loop) > 0) > 1:
+            raise ValueError(
+                f"bad solution! {board_object.solution}, a piece was probably placed off the edge of the board"
+            )
+        d = ""
+        for loop in piece_loops:
+            points = inset(loop, margin / square_size)
+            d += f"M {square_size * points[0][0]} {square_size * points[0][1]} "
+            for x, y in points[1:]:
+                d += f"L {square_size * x} {square_size * y} "
+            d += "Z "
+        shape_index = board_object.solution[i][0]
+        _id = f"{shape_index}_{board_object.shapes[shape_index][0]}"
+        group.add(
+            Path(
+                d=d,
+                fill=colors[coloring[i] % len(colors)],
+                fill_rule="evenodd",
+                id=_id,
+            )
+        )
+    return group
+
+
+class SheetWriter(object):
+    """
+    draws many packings into one svg file, in rows of columns packings, starting a new file
+    every per_page packings. The files are prefix_0001.svg, prefix_0002.svg, and so on,
+    or a single sprite sheet prefix.svg if per_page is None
+    """
+
+    def __init__(self, prefix, columns=10, per_page=100, square_size=10, multicolor=True):
+        self.prefix = prefix
+        self.columns = columns
+        self.per_page = per_page
+        self.square_size = square_size
+        self.multicolor = multicolor
+        self.page = 0
+        self.drawing = None
+        self.count = 0
+
+    def add(self, board_object):
+        if self.drawing is None:
+            self.page += 1
+            filename = (
+                f"{self.prefix}.svg"
+                if self.per_page is None
+                else f"{self.prefix}_{self.page:04d}.svg"
+            )
+            self.drawing = Drawing(filename)
+        # the rows of the board go across the page, as in output_to_svg
+        cell_width = self.square_size * (board_object.l2 + 1)
+        cell_height = self.square_size * (board_object.w2 + 1)
+        row, col = divmod(self.count, self.columns)
+        group = solution_group(
+            board_object,
+            multicolor=self.multicolor,
+            square_size=self.square_size,
+            margin=self.square_size / 10,
+        )
+        group.translate(col * cell_width, row * cell_height)
+        self.drawing.add(group)
+        self.count += 1
+        if self.per_page is not None and self.count == self.per_page:
+            self.close()
+
+    def close(self):
+        if self.drawing is not None:
+            self.drawing.save()
+            self.drawing = None
+            self.count = 0
@@ -0,0 +1,385 @@
+# sat.py - packing as exact cover in CNF, solved by PySAT when it is installed or by a small CDCL solver
+import heapq
+
+from common import Board
+
+try:
+    from pysat.solvers import Solver as PySatSolver
+except ImportError:
+    # python-sat is optional, the built-in solver is used without it
+    PySatSolver = None
+
+
+def at_most_one(lits, next_var):
+    """
+    clauses allowing at most one of lits to be true: every pair for a few literals, else
+    the sequential counter, with aux variables from next_var on. Returns the clauses and
+    the next free variable
+    """
+    if len(lits) <= 6:
+        return [
+            [-lits[i], -lits[j]] for i in range(len(lits)) for j in range(i + 1, len(lits))
+        ], next_var
+    # s[i] is true when one of lits[0..i] is
+    s = list(range(next_var, next_var + len(lits) - 1))
+    clauses = [[-lits[0], s[0]]]
+    for i in range(1, len(lits) - 1):
+        clauses.append([-lits[i], s[i]])
+        clauses.append([-s[i - 1], s[i]])
+        clauses.append([-lits[i], -s[i - 1]])
+    clauses.append([-lits[-1], -s[-1]])
+    return clauses, next_var + len(s)
+
+
+class ExactCoverModel(object):
+    """
+    one variable per placement that fits the board as it is, variable q + 1 for
+    placements[q] = (piece_index, loc). Every empty square is covered by exactly one
+    placement, and on a unique board every piece is used at most once
+    """
+
+    def __init__(self, board_object: Board, first_piece=0):
+        self.placements = []
+        covering = {}
+        by_piece = {}
+        for loc, piece_indices in enumerate(board_object.placements):
+            if board_object.board[loc] is not None:
+                continue
+            for piece_index in piece_indices:
+                if piece_index < first_piece or not board_object.test(loc, piece_index):
+                    continue
+                self.placements.append((piece_index, loc))
+                var = len(self.placements)
+                shape = board_object.shapes[piece_index]
+                covering.setdefault(loc, []).append(var)
+                for k in shape[1:]:
+                    covering.setdefault(loc + k, []).append(var)
+                if board_object.unique:
+                    by_piece.setdefault(shape[0], []).append(var)
+
+        self.clauses = []
+        next_var = len(self.placements) + 1
+        for square, cell in enumerate(board_object.board):
+            if cell is not None:
+                continue
+            lits = covering.get(square, [])
+            # an empty clause if nothing covers the square, there is no packing
+            self.clauses.append(list(lits))
+            clauses, next_var = at_most_one(lits, next_var)
+            self.clauses.extend(clauses)
+        for lits in by_piece.values():
+            clauses, next_var = at_most_one(lits, next_var)
+            self.clauses.extend(clauses)
+        self.variables = next_var - 1
+
+    def decode(self, model):
+        """
+        the placements set in a model, a collection of true literals
+        """
+        count = len(self.placements)
+        return tuple(self.placements[lit - 1] for lit in sorted(model) if 0 < lit <= count)
+
+    def blocking_clause(self, placements):
+        index = {placement: q + 1 for q, placement in enumerate(self.placements)}
+        return [-index[placement] for placement in placements]
+
+    def dimacs(self, stream):
+        """
+        write the model for an external solver
+        """
+        stream.write(f"p cnf {self.variables} {len(self.clauses)}\n")
+        for clause in self.clauses:
+            stream.write(" ".join(str(lit) for lit in clause) + " 0\n")
+
+
+def luby(i):
+    # 1, 1, 2, 1, 1, 2, 4, 1, ...
+    size, power = 1, 0
+    while size < i + 1:
+        power += 1
+        size = 2 * size + 1
+    while size - 1 != i:
+        size = (size - 1) >> 1
+        power -= 1
+        i = i % size
+    return 1 << power
+
+
+class CDCL(object):
+    """
+    a conflict driven clause learning solver: two watched literals, first-UIP learning,
+    activity ordering with phase saving, and Luby restarts. Variables start out false,
+    which suits exact cover, where nearly every placement is false. Learnt clauses are kept
+    """
+
+    restart_unit = 100
+
+    def __init__(self, variables, clauses=()):
+        n = self.n = variables
+        # by literal, at lit + n: 1 true, -1 false, 0 unassigned
+        self.values = [0] * (2 * n + 1)
+        self.watches = [[] for _ in range(2 * n + 1)]
+        self.level = [0] * (n + 1)
+        self.reason = [None] * (n + 1)
+        self.phase = [-1] * (n + 1)
+        self.activity = [0.0] * (n + 1)
+        self.increment = 1.0
+        self.heap = [(0.0, v) for v in range(1, n + 1)]
+        self.clauses = []
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        self.ok = True
+        self.conflicts = 0
+        self.decisions = 0
+        for clause in clauses:
+            self.add_clause(clause)
+
+    def _assign(self, lit, reason):
+        n = self.n
+        self.values[lit + n] = 1
+        self.values[-lit + n] = -1
+        v = abs(lit)
+        self.level[v] = len(self.trail_lim)
+        self.reason[v] = reason
+        self.trail.append(lit)
+
+    def _backtrack(self, level):
+        if len(self.trail_lim) <= level:
+            return
+        n, values, activity, heap = self.n, self.values, self.activity, self.heap
+        start = self.trail_lim[level]
+        for lit in self.trail[start:]:
+            v = abs(lit)
+            self.phase[v] = 1 if lit > 0 else -1
+            values[lit + n] = values[-lit + n] = 0
+            self.reason[v] = None
+            heapq.heappush(heap, (-activity[v], v))
+        del self.trail[start:]
+        del self.trail_lim[level:]
+        self.qhead = len(self.trail)
+
+    def add_clause(self, clause):
+        """
+        add a clause, e.g. one blocking the last model, and undo the decisions
+        """
+        if not self.ok:
+            return
+        self._backtrack(0)
+        n, values = self.n, self.values
+        lits = []
+        for lit in clause:
+            if values[lit + n] == 1 or -lit in lits:
+                return
+            if values[lit + n] == 0 and lit not in lits:
+                lits.append(lit)
+        if not lits:
+            self.ok = False
+        elif len(lits) == 1:
+            self._assign(lits[0], None)
+            self.ok = self._propagate() is None
+        else:
+            self.clauses.append(lits)
+            self.watches[lits[0] + n].append(len(self.clauses) - 1)
+            self.watches[lits[1] + n].append(len(self.clauses) - 1)
+
+    def _propagate(self):
+        # the index of a clause that is false, or None
+        n, values, watches, clauses, trail = self.n, self.values, self.watches, self.clauses, self.trail
+        while self.qhead < len(trail):
+            false_lit = -trail[self.qhead]
+            self.qhead += 1
+            watching = watches[false_lit + n]
+            keep = []
+            for position, ci in enumerate(watching):
+                clause = clauses[ci]
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], false_lit
+                first = clause[0]
+                if values[first + n] == 1:
+                    keep.append(ci)
+                    continue
+                for k in range(2, len(clause)):
+                    if values[clause[k] + n] != -1:
+                        clause[1], clause[k] = clause[k], false_lit
+                        watches[clause[1] + n].append(ci)
+                        break
+                else:
+                    keep.append(ci)
+                    if values[first + n] == -1:
+                        keep.extend(watching[position + 1 :])
+                        watches[false_lit + n] = keep
+                        return ci
+                    self._assign(first, ci)
+            watches[false_lit + n] = keep
+        return None
+
+    def _bump(self, v):
+        self.activity[v] += self.increment
+        if self.activity[v] > 1e100:
+            self.activity = [a * 1e-100 for a in self.activity]
+            self.increment *= 1e-100
+            self.heap = [(-self.activity[u], u) for u in range(1, self.n + 1)]
+            heapq.heapify(self.heap)
+        elif not self.values[v + self.n]:
+            heapq.heappush(self.heap, (-self.activity[v], v))
+
+    def _analyze(self, ci):
+        # the first-UIP clause learnt from the conflict, its asserting literal first
+        level, reason, trail, clauses = self.level, self.reason, self.trail, self.clauses
+        current = len(self.trail_lim)
+        seen = set()
+        learnt = [None]
+        pending = 0
+        index = len(trail) - 1
+        lits = clauses[ci]
+        while True:
+            for q in lits:
+                v = abs(q)
+                if v not in seen and level[v] > 0:
+                    seen.add(v)
+                    self._bump(v)
+                    if level[v] == current:
+                        pending += 1
+                    else:
+                        learnt.append(q)
+            while abs(trail[index]) not in seen:
+                index -= 1
+            p = trail[index]
+            index -= 1
+            pending -= 1
+            if not pending:
+                break
+            # the implied literal is first in its reason
+            lits = clauses[reason[abs(p)]][1:]
+        learnt[0] = -p
+        back = 0
+        if len(learnt) > 1:
+            deepest = max(range(1, len(learnt)), key=lambda k: level[abs(learnt[k])])
+            learnt[1], learnt[deepest] = learnt[deepest], learnt[1]
+            back = level[abs(learnt[1])]
+        return learnt, back
+
+    def _decide(self):
+        heap, values, n = self.heap, self.values, self.n
+        while heap:
+            _, v = heapq.heappop(heap)
+            if not values[v + n]:
+                return v
+        return None
+
+    def solve(self):
+        """
+        a model as the list of true literals, or None if there is none
+        """
+        if not self.ok:
+            return None
+        restarts = 0
+        limit = self.restart_unit * luby(restarts)
+        conflicts = 0
+        while True:
+            ci = self._propagate()
+            if ci is not None:
+                if not self.trail_lim:
+                    self.ok = False
+                    return None
+                learnt, back = self._analyze(ci)
+                self._backtrack(back)
+                if len(learnt) == 1:
+                    self._assign(learnt[0], None)
+                else:
+                    self.clauses.append(learnt)
+                    self.watches[learnt[0] + self.n].append(len(self.clauses) - 1)
+                    self.watches[learnt[1] + self.n].append(len(self.clauses) - 1)
+                    self._assign(learnt[0], len(self.clauses) - 1)
+                self.increment /= 0.95
+                self.conflicts += 1
+                conflicts += 1
+                if conflicts >= limit:
+                    self._backtrack(0)
+                    restarts += 1
+                    limit = self.restart_unit * luby(restarts)
+                    conflicts = 0
+                continue
+            v = self._decide()
+            if v is None:
+                return [v if self.values[v + self.n] == 1 else -v for v in range(1, self.n + 1)]
+            self.decisions += 1
+            self.trail_lim.append(len(self.trail))
+            self._assign(v if self.phase[v] > 0 else -v, None)
+
+
+class BuiltinSolver(object):
+    def __init__(self, model):
+        self.solver = CDCL(model.variables, model.clauses)
+
+    def solve(self):
+        return self.solver.solve()
+
+    def decisions(self):
+        return self.solver.decisions
+
+    def add_clause(self, clause):
+        self.solver.add_clause(clause)
+
+
+class PySat(object):
+    def __init__(self, model):
+        self.solver = PySatSolver(bootstrap_with=model.clauses)
+
+    def solve(self):
+        if not self.solver.solve():
+            return None
+        return self.solver.get_model()
+
+    def decisions(self):
+        return self.solver.accum_stats().get("decisions", 0)
+
+    def add_clause(self, clause):
+        self.solver.add_clause(clause)
+
+
+backends = {"builtin": BuiltinSolver}
+if PySatSolver is not None:
+    backends["pysat"] = PySat
+default_backend = "pysat" if "pysat" in backends else "builtin"
+
+
+def solutions(board_object: Board, first_piece=0, backend=None):
+    """
+    search.solutions with a SAT solver: yield board_object with each packing of its empty
+    squares on it, then rule that packing out and solve again. backend is a key of backends,
+    pysat when it is installed by default. The built-in solver takes far longer than the
+    backtracking search to go through every packing this way, it is for finding one
+    """
+    if backend is None:
+        backend = default_backend
+    model = ExactCoverModel(board_object, first_piece)
+    solver = backends[backend](model)
+    counted = 0
+    while True:
+        true_lits = solver.solve()
+        # a decision stands for a node in --stats, the choice search.solutions makes at findloc
+        decisions = solver.decisions()
+        board_object.count_nodes(decisions - counted, true_lits is not None)
+        counted = decisions
+        if true_lits is None:
+            return
+        placements = model.decode(lit for lit in true_lits if lit > 0)
+        for piece_index, loc in placements:
+            board_object.place_on_board(piece_index, loc)
+        yield board_object
+        for piece_index, loc in reversed(placements):
+            board_object.remove_piece_from_board(piece_index, loc)
+        solver.add_clause(model.blocking_clause(placements))
+
+
+def fill_with_sat(first_piece=0, backend=None):
+    """
+    a fill function for search.iter_solutions. skip is not used, roots and reject still are
+    """
+
+    def fill(board_object, skip=None):
+        return solutions(board_object, first_piece, backend)
+
+    return fill
@@ -0,0 +1,106 @@
+# search.py - the plain backtracking search, shared by the engines that are not tied to one script
+from common import Board
+
+
+def solutions(board_object: Board, first_piece=0, skip=None):
+    """
+    fill the first empty square with every shape that fits, recursively, and yield
+    board_object every time the board is full. board_object.solution holds the placements.
+    shapes before first_piece are never placed, and skip(board_object, loc, piece_index)
+    can veto placements, e.g. for symmetry breaking
+    """
+    loc = board_object.findloc()
+    if loc is None:
+        yield board_object
+        return
+    for piece_index in board_object.placements[loc]:
+        if piece_index < first_piece or not board_object.test(loc, piece_index):
+            continue
+        if skip is not None and skip(board_object, loc, piece_index):
+            continue
+        board_object.place_on_board(piece_index, loc)
+        if board_object.prune and board_object.dead_end(piece_index, loc):
+            board_object.remove_piece_from_board(piece_index, loc)
+            continue
+        yield from solutions(board_object, first_piece, skip)
+        board_object.remove_piece_from_board(piece_index, loc)
+
+
+def count_solutions(board_object: Board, roots=((),), first_piece=0, skip=None, reject=None):
+    """
+    the number of packings, for when only the totals matter: nothing is built or copied
+    for a packing, the counts are plain integers summed up the recursion.
+    the arguments mean the same as for iter_solutions
+    """
+    count = 0
+    for root in roots:
+        for piece_index, loc in root:
+            board_object.place_on_board(piece_index, loc)
+        count += _count(board_object, first_piece, skip, reject)
+        for piece_index, loc in reversed(root):
+            board_object.remove_piece_from_board(piece_index, loc)
+    return count
+
+
+def _count(board_object, first_piece, skip, reject):
+    loc = board_object.findloc()
+    if loc is None:
+        if reject is not None and reject(board_object):
+            return 0
+        return 1
+    count = 0
+    for piece_index in board_object.placements[loc]:
+        if piece_index < first_piece or not board_object.test(loc, piece_index):
+            continue
+        if skip is not None and skip(board_object, loc, piece_index):
+            continue
+        board_object.place_on_board(piece_index, loc)
+        if not (board_object.prune and board_object.dead_end(piece_index, loc)):
+            count += _count(board_object, first_piece, skip, reject)
+        board_object.remove_piece_from_board(piece_index, loc)
+    return count
+
+
+def iter_solutions(
+    board_object: Board,
+    limit=None,
+    roots=((),),
+    first_piece=0,
+    skip=None,
+    reject=None,
+    fill=None,
+):
+    """
+    yield the packings of board_object one at a time, as tuples of (piece_index, loc)
+    placements, so the caller can stop early, count them, or pass them on without any
+    printing or svg files. While the caller handles a packing it is still on board_object,
+    so print_board and output_to_svg work on it.
+
+    roots are the prefixes the board is filled from, e.g. SymmetryBreaker.roots(),
+    reject(board_object) drops full boards, fill(board_object, skip=skip) is the search engine,
+    solutions by default or dlx.dancing_links, and no more than limit packings are yielded.
+    The board is left empty again when the generator is finished or closed
+    """
+    found = 0
+    if limit is not None and found >= limit:
+        return
+    for root in roots:
+        depth = len(board_object.solution)
+        for piece_index, loc in root:
+            board_object.place_on_board(piece_index, loc)
+        try:
+            if fill is None:
+                boards = solutions(board_object, first_piece, skip)
+            else:
+                boards = fill(board_object, skip=skip)
+            for _ in boards:
+                if reject is not None and reject(board_object):
+                    continue
+                yield tuple(board_object.solution)
+                found += 1
+                if found == limit:
+                    return
+        finally:
+            # a search that was stopped early leaves its pieces on the board
+            while len(board_object.solution) > depth:
+                board_object.remove_piece_from_board(*board_object.solution[-1])
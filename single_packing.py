@@ -1,14 +1,32 @@
 # pack a single polyomino shape into a rectangle
 import sys
 import os
+import signal
 from argparse import ArgumentParser
-from copy import deepcopy
-from multiprocessing import Pool
 from time import time
 
-from constraint import Problem
-
+from archive import ArchiveReader
+from bitboard import BitBoard
+from budget import Budget, within
 from common import Board, rebuild_shapes, output_to_svg
+from dedup import CanonicalKey, KeyStore, distinct_keys
+from dlx import fill_with_dlx
+from feasibility import check_regions, infeasible
+from instrument import SearchStats, instrument
+from iterative import IterativeSearch, load_checkpoint
+import kernel
+from memo import MemoCounter
+from parallel import parallel_search, split
+from polyomino import compile_shapes, parse
+from sat import backends, default_backend, fill_with_sat
+
+try:
+    from numpyboard import NumpyBoard
+except ImportError:
+    # numpy is optional, it is only needed for --numpy
+    NumpyBoard = None
+from strategy import fill_with, strategies
+from symmetry import SymmetryBreaker, placement_symmetries
 
 heptominos = [
     [0, 1, 7, 8, 9, 10, 11],
@@ -50,31 +68,29 @@ tetrominos = [
     [14, 8, 15, 16],  # O
 ]
 
+# the shape tables, and whether each orientation can only be placed once
+shape_sets = {
+    "heptominos": (heptominos, False),
+    "hexominos": (hexominos, False),
+    "tetrominos": (tetrominos, False),
+}
 
 start_time = time()
 
-number_placed = 0
-iterations = 0
-best_solution = []
-best_solution_loc = 0
+# the search never tries the orientations before this one
+first_piece = 3
 
 
 class HexominoBoard(Board):
     def __init__(self, width, length, debug, margin=True):
         super().__init__(
-            width, length, hexominos, margin=margin, unique=True, debug=debug
+            width, length, hexominos, margin=margin, unique=False, debug=debug
         )
 
-    def test(self, loc, pattern):
-        for shape_loc in self.shapes[pattern][1:]:
-            if self.board[loc + shape_loc] is not None:
-                return 0
-        return 1
-
 
 class HeptominoBoard(Board):
     def __init__(self, width, length, debug):
-        super().__init__(width, length, heptominos, unique=True, debug=debug)
+        super().__init__(width, length, heptominos, unique=False, debug=debug)
 
 
 class TetronimoBoard(Board):
@@ -82,123 +98,19 @@ class TetronimoBoard(Board):
         super().__init__(width, length, tetrominos, unique=False)
 
 
-def constraint_solution(board_object):
-    problem = Problem()
-    # heptominos
-    number_of_pieces = 76
-    width = 28
-    length = 19
-    # board locations
-    variables = [f"row{row}col{col}" for row in range(width) for col in range(length)]
-    # pieces
-    values = [
-        f"piece{piece}part{part}"
-        for part in range(7)
-        for piece in range(number_of_pieces)
-    ]
-    for variable in variables:
-        problem.addVariable(variable, values)
-    # only one piece per board location
-    for location1 in variables:
-        for location2 in variables:
-            if location1 == location2:
-                continue
-            problem.addConstraint(lambda x, y: x != y, (location1, location2))
-
-    # add constraints for the pieces
-
-    for i in range(len(variables)):
-
-        def piece_constraint(*args):
-            location = i
-            board = args[1:]
-            # go through and add the satisfaction constraint for each type of piece
-            for shape in board_object.shapes:
-                for shape_index in range(number_of_pieces):
-                    other_parts = []
-                    for part, offset in enumerate(shape[1:]):
-                        if (location + offset) >= len(board):  # piece is off the board
-                            return 0
-
-                        other_parts.append(
-                            board[location + offset]
-                            == f"piece{shape_index}part{part + 1}"
-                        )
-                    if board[location] == f"piece{shape_index}part0" and all(
-                        other_parts
-                    ):
-                        return 1
-            return 0
-
-        problem.addConstraint(piece_constraint, (variables))
-
-    return problem.getSolution()
-
-
-def place_piece(board_object, loc, piece_index):
-    if not board_object.test(loc, piece_index):
-        piece_index += 1
-        return board_object, loc, piece_index
-
-    board_object.place_on_board(loc=loc, piece_index=piece_index)
-
-    next_loc = board_object.findloc()
-    if not next_loc:
-        output_to_svg(board_object)
-        #  print solution
-        print(f"solution: {time() - board_object.start_time}")
-    else:
-        return board_object, next_loc, 0
-    #  remove piece
-    board_object.remove_piece_from_board(piece_index, loc)
-    piece_index += 1
-    return board_object, loc, piece_index
+# with --dedup, the keys of the packings seen so far
+canonical = None
+seen = None
 
 
-# place a piece in the board; recursive
-def place(board_object, nsols):
-    piece_index = 3
+def is_new(board_object):
+    # only the first packing of each symmetry class counts, in this run or an earlier one
+    return seen is None or seen.add(canonical.digest(board_object))
 
-    global number_placed
-    global iterations
-    global best_solution_loc
-    global best_solution
 
-    iterations += 1
-    while (loc := board_object.findloc()) and piece_index < len(board_object.shapes):
-        if not board_object.test(loc, piece_index):
-            piece_index += 1
-            continue
-        if iterations % 100000 == 0:
-            print(f"{iterations=}")
-
-        board_object.place_on_board(loc=loc, piece_index=piece_index)
-
-        if board_object.debug:
-            print(
-                f"placing piece [{piece_index}] at square {loc}"
-            )  # if the entire board is occupied
-            board_object.print_board()
-            print(loc, board_object.solution)
-        if not board_object.findloc():
-            output_to_svg(board_object)
-            #  print solution
-            if board_object.debug:
-                print(f"solution: {time()-board_object.start_time}")
-                board_object.print_board()
-        else:
-            nsols = place(board_object, nsols)
-        if best_solution_loc < len(board_object.solution):
-            best_solution = board_object.solution
-            best_solution_loc = len(board_object.solution)
-            board_object.print_board()
-            print(
-                f"new best solution! {best_solution_loc}  {piece_index=} {iterations=}"
-            )
-
-        #  remove piece
-        board_object.remove_piece_from_board(piece_index, loc)
-        piece_index += 1
+def show_best(board_object, budget):
+    board_object.print_board()
+    print(f"new best solution! {len(budget.best)} pieces {budget.nodes} nodes")
 
 
 if __name__ == "__main__":
@@ -216,13 +128,184 @@ if __name__ == "__main__":
         help="print debugging info",
     )
     parser.add_argument(
-        "--csp", dest="use_csp", action="store_true", help="save solution as svg"
+        "--shapes",
+        dest="shapes",
+        choices=sorted(shape_sets),
+        default="heptominos",
+        help="the shapes to pack",
+    )
+    parser.add_argument(
+        "--piece",
+        dest="pieces",
+        action="append",
+        default=[],
+        help="pack this piece instead of --shapes, drawn as rows of X separated by /, e.g. XXX/X",
+    )
+    parser.add_argument(
+        "--width", dest="width", type=int, default=26, help="the board width"
+    )
+    parser.add_argument(
+        "--length", dest="length", type=int, default=21, help="the board length"
+    )
+    parser.add_argument(
+        "--memo",
+        dest="memo",
+        action="store_true",
+        help="count the packings, caching the count for every state of the fill",
+    )
+    parser.add_argument(
+        "--cache-size",
+        dest="cache_size",
+        type=int,
+        default=1 << 20,
+        help="number of states --memo keeps",
+    )
+    parser.add_argument(
+        "--iterative",
+        dest="iterative",
+        action="store_true",
+        help="search with an explicit stack instead of recursion",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        dest="checkpoint",
+        type=str,
+        default="",
+        help="save the state of the search to this file, on a timer, on SIGUSR1 and on SIGTERM",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        dest="checkpoint_every",
+        type=float,
+        default=600,
+        help="seconds between checkpoints",
+    )
+    parser.add_argument(
+        "--resume",
+        dest="resume",
+        type=str,
+        default="",
+        help="continue the search saved in this checkpoint file",
+    )
+    parser.add_argument(
+        "--csp",
+        dest="use_csp",
+        action="store_true",
+        help="find a packing as exact cover in CNF with a SAT solver, only the first one "
+        "unless --max-solutions is given or python-sat is installed",
+    )
+    parser.add_argument(
+        "--sat-solver",
+        dest="sat_solver",
+        choices=sorted(backends),
+        default=None,
+        help="the SAT solver for --csp, pysat when python-sat is installed",
+    )
+    parser.add_argument(
+        "--stats",
+        dest="stats",
+        type=str,
+        default="",
+        help="write search counters as JSON lines to this file, - for the screen",
+    )
+    parser.add_argument(
+        "--stats-every",
+        dest="stats_every",
+        type=int,
+        default=100000,
+        help="number of search nodes between --stats lines",
+    )
+    parser.add_argument(
+        "--prune",
+        dest="prune",
+        action="store_true",
+        help="drop placements that leave an empty region no set of pieces can fill",
+    )
+    parser.add_argument(
+        "--dlx",
+        dest="use_dlx",
+        action="store_true",
+        help="solve as an exact cover problem with dancing links",
+    )
+    parser.add_argument(
+        "--order",
+        dest="order",
+        choices=sorted(strategies),
+        default="first",
+        help="fill the first empty square, or the one the fewest placements can cover",
+    )
+    parser.add_argument(
+        "--kernel",
+        dest="kernel",
+        action="store_true",
+        help="run the search in _kernel.c if it is built, see kernel.py",
+    )
+    parser.add_argument(
+        "--symmetry",
+        dest="symmetry",
+        action="store_true",
+        help="only find one packing of each symmetry class of the board",
     )
     parser.add_argument(
         "--multiprocess",
         dest="use_multi",
         action="store_true",
-        help="run multi processes",
+        help="search in a pool of processes",
+    )
+    parser.add_argument(
+        "--processes",
+        dest="processes",
+        type=int,
+        default=None,
+        help="number of processes for --multiprocess, defaults to one per core",
+    )
+    parser.add_argument(
+        "--split-depth",
+        dest="split_depth",
+        type=int,
+        default=2,
+        help="number of pieces --multiprocess places before handing out work",
+    )
+    parser.add_argument(
+        "--max-solutions",
+        dest="max_solutions",
+        type=int,
+        default=None,
+        help="stop after this many packings, 1 to only find out if there is one",
+    )
+    parser.add_argument(
+        "--max-seconds",
+        dest="max_seconds",
+        type=float,
+        default=None,
+        help="stop the search after this many seconds",
+    )
+    parser.add_argument(
+        "--max-nodes",
+        dest="max_nodes",
+        type=int,
+        default=None,
+        help="stop the search after placing this many pieces",
+    )
+    parser.add_argument(
+        "--dedup",
+        dest="dedup",
+        type=str,
+        default="",
+        help="keep the keys of the packings found in this directory, and skip packings that "
+        "are a reflection or rotation of one found before, in this run or an earlier one",
+    )
+    parser.add_argument(
+        "--numpy",
+        dest="numpy",
+        action="store_true",
+        help="keep a NumPy copy of the board to fit many shapes at once, needs numpy",
+    )
+    parser.add_argument(
+        "--bitboard",
+        dest="bitboard",
+        action="store_true",
+        help="keep the board occupancy as a bitmask, which searches faster",
     )
     parser.add_argument(
         "--from-string",
@@ -231,9 +314,34 @@ if __name__ == "__main__":
         default="",
         help="plot a ",
     )
-    parser.add_argument("--plot-filename", dest="plot_filename", type=str, default="")
+    parser.add_argument(
+        "--plot-filename",
+        dest="plot_filename",
+        type=str,
+        default="",
+        help="draw the packings in this file, from_str lines or a .ppa archive",
+    )
 
     args = parser.parse_args()
+    budgeted = [args.max_solutions, args.max_seconds, args.max_nodes] != [None, None, None]
+    if (args.iterative or args.checkpoint or args.resume) and not args.memo and budgeted:
+        parser.error(
+            "--max-solutions, --max-seconds and --max-nodes do not stop --iterative or "
+            "--checkpoint, send SIGTERM to stop those"
+        )
+    if args.prune and (args.use_dlx or args.use_csp):
+        # neither puts a piece on the board before the packing is complete
+        parser.error(
+            "--prune does not prune --dlx or --csp, which find the squares nothing covers "
+            "on their own"
+        )
+    if args.prune and args.kernel:
+        parser.error("_kernel.c does not prune, leave out --kernel to search with --prune")
+    if args.kernel and not kernel.available:
+        print(
+            f"warning: {kernel.library_path} is not built, searching in python instead, "
+            "python kernel.py builds it"
+        )
     """
     width = 24
     length = 23
@@ -250,6 +358,17 @@ if __name__ == "__main__":
         _board.print_board()
         output_to_svg(_board, False)
         sys.exit()
+    if args.plot_filename.endswith(".ppa"):
+        with ArchiveReader(args.plot_filename) as reader:
+            _board = reader.board()
+            for solution in reader:
+                for piece_index, loc in solution:
+                    _board.place_on_board(piece_index, loc)
+                _board.print_board()
+                output_to_svg(_board, multicolor=False)
+                for piece_index, loc in reversed(solution):
+                    _board.remove_piece_from_board(piece_index, loc)
+        sys.exit()
     if args.plot_filename:
         filename = os.path.splitext(args.plot_filename)[0]
         print(filename)
@@ -265,50 +384,159 @@ if __name__ == "__main__":
                 output_to_svg(_board, multicolor=False)
         sys.exit()
 
-    width = 26
-    length = 21
-    _board = HeptominoBoard(width, length, args.debug)
-
-    rebuild_shapes(_board, margin=not args.use_csp)
-    if args.use_csp:
-        print(constraint_solution(_board))
+    if args.resume:
+        checkpoint_state = load_checkpoint(args.resume)
+        # the search has to carry on with the board it was saved from
+        for key, value in checkpoint_state["header"].items():
+            setattr(args, key, value)
+        args.checkpoint = args.checkpoint or args.resume
+
+    if args.pieces:
+        # every orientation of the pieces, as many copies of each as fit
+        shape_table = compile_shapes([parse(piece) for piece in args.pieces], args.width + 2)
+        unique = False
+        first_piece = 0
+        args.shapes = "pieces"
+    else:
+        shape_table, unique = shape_sets[args.shapes]
+    board_class = BitBoard if args.bitboard else Board
+    if args.numpy:
+        if NumpyBoard is None:
+            parser.error("--numpy needs numpy installed")
+        board_class = NumpyBoard
+    _board = board_class(
+        args.width, args.length, shape_table, unique=unique, debug=args.debug
+    )
+    _board.name = args.shapes
+    _board.prune = args.prune
+    if args.stats:
+        stats_stream = sys.stdout if args.stats == "-" else open(args.stats, "w")
+        instrument(_board, SearchStats(every=args.stats_every, stream=stats_stream))
+
+    if args.pieces:
+        # the compiled table is already on the board's grid
+        _board.build_tables()
+    else:
+        rebuild_shapes(_board)
+    reason = infeasible(_board)
+    if reason is not None:
+        print(f"no packing of {args.width}x{args.length}, ruled out by {reason}")
+        sys.exit()
+    if args.prune:
+        check_regions(_board)
+    if (args.symmetry or args.dedup) and len(placement_symmetries(_board)) == 1:
+        # e.g. a table without every orientation of its pieces
+        print(
+            "warning: no reflection or rotation of the board maps the placements onto "
+            "placements, so --symmetry and --dedup only drop packings found twice"
+        )
+    if args.dedup:
+        canonical = CanonicalKey(_board)
+        seen = KeyStore(args.dedup)
+    if args.memo:
+        counter = MemoCounter(_board, maxsize=args.cache_size, first_piece=first_piece)
+        print(f"{counter.count()} solutions")
+        print(counter.stats())
+    elif args.checkpoint or args.iterative:
+        roots, reject = ((),), None
+        if args.symmetry:
+            breaker = SymmetryBreaker(_board)
+            roots, reject = breaker.roots(), breaker.is_duplicate
+        search = IterativeSearch(
+            _board,
+            roots=roots,
+            first_piece=first_piece,
+            reject=reject,
+            checkpoint=args.checkpoint or None,
+            checkpoint_every=args.checkpoint_every,
+            header={
+                "shapes": args.shapes,
+                "pieces": args.pieces,
+                "width": args.width,
+                "length": args.length,
+                "prune": args.prune,
+                "symmetry": args.symmetry,
+            },
+        )
+        if args.resume:
+            search.resume(checkpoint_state)
+        if args.checkpoint:
+            signal.signal(signal.SIGUSR1, lambda *_: search.request_checkpoint())
+            signal.signal(signal.SIGTERM, lambda *_: search.request_checkpoint(stop=True))
+        for _ in search.solutions():
+            if not is_new(_board):
+                continue
+            output_to_svg(_board)
+            print(f"solution {search.count}: {search.elapsed + time() - start_time}")
+        if search.stop_requested:
+            print(f"stopped, resume with --resume {args.checkpoint}")
+            if seen is not None:
+                seen.close()
+            sys.exit()
+        print(f"{search.count} solutions")
     elif args.use_multi:
-        # solutions that have already been evaluated
-        evaluated = set()
-        # initial set - all pieces at loc 0
-        start_loc = _board.findloc()
-        to_evaluate = [
-            (deepcopy(_board), start_loc, piece_index)
-            for piece_index in range(len(_board.shapes))
-        ]
-        num_processes = 4
-        pool = Pool(processes=num_processes)
-        while to_evaluate:
-            eval_set = []
-            for _ in range(num_processes):
-                if to_evaluate:
-                    eval_set.append(to_evaluate.pop())
-            multiple_results = []
-            for eval_args in eval_set:
-                board_hash = eval_args[0].hash(eval_args[2])
-                evaluated.add(board_hash)
-                multiple_results.append(pool.apply_async(place_piece, eval_args))
-            for res in multiple_results:
-                result = res.get(timeout=60)
-                next_solution_hash = result[0].hash((result[2]))
-                if next_solution_hash in evaluated:
-                    continue
-                if result[2] >= len(result[0].shapes):
-                    continue
-                if result[2] == 0:
-                    to_evaluate += [
-                        (deepcopy(result[0]), result[1], piece_index)
-                        for piece_index in range(len(result[0].shapes))
-                    ]
-                    continue
-                to_evaluate.append(result)
+        prefixes = split(_board, args.split_depth, first_piece=first_piece)
+        for _, _, found in parallel_search(
+            _board, prefixes, processes=args.processes, first_piece=first_piece
+        ):
+            for solution in found:
+                for piece_index, loc in solution:
+                    _board.place_on_board(piece_index, loc)
+                if is_new(_board):
+                    output_to_svg(_board)
+                    print(f"solution: {time() - _board.start_time}")
+                for piece_index, loc in reversed(solution):
+                    _board.remove_piece_from_board(piece_index, loc)
     else:
-        place(_board, nsols=1)
+        roots, reject = ((),), None
+        if args.symmetry:
+            breaker = SymmetryBreaker(_board)
+            roots, reject = breaker.roots(), breaker.is_duplicate
+        fill = None
+        if args.use_dlx:
+            fill = fill_with_dlx(first_piece)
+        elif args.use_csp:
+            fill = fill_with_sat(first_piece, args.sat_solver)
+        elif args.order != "first":
+            fill = fill_with(args.order, first_piece)
+        elif args.kernel:
+            fill = kernel.fill_with_kernel(first_piece)
+        max_solutions = args.max_solutions
+        backend = args.sat_solver or default_backend
+        if args.use_csp and max_solutions is None and backend == "builtin":
+            # the built-in solver is slow to rule out one packing after another
+            max_solutions = 1
+        budget = Budget(
+            solutions=max_solutions,
+            seconds=args.max_seconds,
+            nodes=args.max_nodes,
+            on_best=show_best,
+        )
+        for _ in within(
+            _board, budget, roots=roots, first_piece=first_piece, reject=reject, fill=fill
+        ):
+            if not is_new(_board):
+                continue
+            output_to_svg(_board)
+            print(f"solution: {time() - _board.start_time}")
+            if args.debug:
+                _board.print_board()
+        print(budget.report())
+        if budget.reason and not budget.found:
+            # no packing in the budget, show the deepest partial one
+            for piece_index, loc in budget.best:
+                _board.place_on_board(piece_index, loc)
+            _board.print_board()
+            for piece_index, loc in reversed(budget.best):
+                _board.remove_piece_from_board(piece_index, loc)
     _board.print_board()
+    if args.prune:
+        print(f"{_board.pruned} placements pruned")
+    if args.stats:
+        _board.stats.report()
+    if seen is not None:
+        seen.close()
+        total = sum(1 for _ in distinct_keys(args.dedup))
+        print(f"{seen.added} new packings, {total} in {args.dedup}")
 
     print("done!")
@@ -0,0 +1,183 @@
+# strategy.py - choose which empty square the search fills next
+from common import Board
+
+try:
+    popcount = int.bit_count
+except AttributeError:
+    # before python 3.10
+    def popcount(bits):
+        return bin(bits).count("1")
+
+
+class FirstEmpty(object):
+    """
+    the first empty square in row-major order, as Board.findloc finds it. Only shapes
+    anchored on that square can cover it, so the options are board_object.placements[loc]
+    """
+
+    def __init__(self, board_object: Board, first_piece=0):
+        self.board_object = board_object
+        self.first_piece = first_piece
+
+    def select(self):
+        return self.board_object.findloc()
+
+    def options(self, loc):
+        board_object = self.board_object
+        return [
+            (piece_index, loc)
+            for piece_index in board_object.placements[loc]
+            if piece_index >= self.first_piece and board_object.test(loc, piece_index)
+        ]
+
+    def place(self, piece_index, loc):
+        pass
+
+    def remove(self, piece_index, loc):
+        pass
+
+
+class MostConstrained(object):
+    """
+    the empty square the fewest placements can still cover. Every placement that fits the
+    empty board gets a bit, and live holds the bits of the placements nothing on the board
+    rules out, as an int. Placing a piece clears the bits of the placements it rules out
+    (those sharing a square with it, and those of the same piece on a unique board), and
+    removing it puts live back as it was, so keeping the counts up to date costs a few
+    operations on ints instead of a walk over every placement ruled out. The square to fill
+    next is the empty one with the fewest live placements over it, and none is a dead end.
+
+    When every piece of a unique board has to go on it, the pieces are constraints as well,
+    as in dlx.exact_cover: if an unused piece has fewer placements left than any square,
+    select() returns it, as -1 - piece, and the search tries each place it can go.
+    """
+
+    def __init__(self, board_object: Board, first_piece=0):
+        self.board_object = board_object
+        self.entries = []
+        self.squares = []
+        # the bits of the placements over each square, and of each piece on a unique board
+        self.covering = [0] * len(board_object.board)
+        self.by_piece = {}
+        for loc, piece_indices in enumerate(board_object.placements):
+            for piece_index in piece_indices:
+                if piece_index < first_piece:
+                    continue
+                shape = board_object.shapes[piece_index]
+                bit = 1 << len(self.entries)
+                self.entries.append((piece_index, loc))
+                self.squares.append([loc] + [loc + k for k in shape[1:]])
+                for square in self.squares[-1]:
+                    self.covering[square] |= bit
+                if board_object.unique:
+                    self.by_piece[shape[0]] = self.by_piece.get(shape[0], 0) | bit
+        self.index = {entry: q for q, entry in enumerate(self.entries)}
+        self.piece_of = [board_object.shapes[piece_index][0] for piece_index, _ in self.entries]
+
+        # start from the board as it is, e.g. with the root of the search on it
+        board = board_object.board
+        self.empty = [cell is None for cell in board]
+        self.free = [square for square, cell in enumerate(board) if cell is None]
+        self.live = 0
+        for q, squares in enumerate(self.squares):
+            if board_object.unique and board_object.used[self.piece_of[q]]:
+                continue
+            if all(board[square] is None for square in squares):
+                self.live |= 1 << q
+        # live before each placement, to put back on remove
+        self.stack = []
+
+        # the pieces select() weighs against the squares, if they all have to go on the board
+        self.pieces = []
+        area = sum(board_object.piece_sizes[piece] for piece in self.by_piece)
+        if board_object.unique and area == len(self.free) + sum(
+            board_object.piece_sizes[board_object.shapes[piece_index][0]]
+            for piece_index, _ in board_object.solution
+        ):
+            self.pieces = [piece for piece in self.by_piece if not board_object.used[piece]]
+
+    def select(self):
+        best = None
+        fewest = None
+        live, empty, covering = self.live, self.empty, self.covering
+        for square in self.free:
+            if not empty[square]:
+                continue
+            count = popcount(live & covering[square])
+            if fewest is None or count < fewest:
+                best, fewest = square, count
+                if not fewest:
+                    break
+        else:
+            used = self.board_object.used
+            for piece in self.pieces:
+                if used[piece]:
+                    continue
+                count = popcount(live & self.by_piece[piece])
+                if fewest is None or count < fewest:
+                    best, fewest = -1 - piece, count
+        self.board_object.count_nodes(1, best is None)
+        return best
+
+    def options(self, square):
+        if square < 0:
+            bits = self.live & self.by_piece[-1 - square]
+        else:
+            bits = self.live & self.covering[square]
+        entries = []
+        while bits:
+            bit = bits & -bits
+            entries.append(self.entries[bit.bit_length() - 1])
+            bits ^= bit
+        return entries
+
+    def place(self, piece_index, loc):
+        q = self.index[(piece_index, loc)]
+        ruled_out = self.by_piece.get(self.piece_of[q], 0)
+        for square in self.squares[q]:
+            self.empty[square] = False
+            ruled_out |= self.covering[square]
+        self.stack.append(self.live)
+        self.live &= ~ruled_out
+
+    def remove(self, piece_index, loc):
+        for square in self.squares[self.index[(piece_index, loc)]]:
+            self.empty[square] = True
+        self.live = self.stack.pop()
+
+
+strategies = {"first": FirstEmpty, "constrained": MostConstrained}
+
+
+def solutions(board_object: Board, strategy, skip=None):
+    """
+    search.solutions, filling the square strategy.select() picks with every placement
+    strategy.options() gives for it. With MostConstrained the packings come in a different
+    order, but each one still comes exactly once
+    """
+    square = strategy.select()
+    if square is None:
+        yield board_object
+        return
+    for piece_index, loc in strategy.options(square):
+        if skip is not None and skip(board_object, loc, piece_index):
+            continue
+        board_object.place_on_board(piece_index, loc)
+        if board_object.prune and board_object.dead_end(piece_index, loc):
+            board_object.remove_piece_from_board(piece_index, loc)
+            continue
+        strategy.place(piece_index, loc)
+        yield from solutions(board_object, strategy, skip)
+        strategy.remove(piece_index, loc)
+        board_object.remove_piece_from_board(piece_index, loc)
+
+
+def fill_with(name, first_piece=0):
+    """
+    a fill function for search.iter_solutions that searches with the named strategy
+    """
+
+    def fill(board_object, skip=None):
+        return solutions(board_object, strategies[name](board_object, first_piece), skip)
+
+    return fill
@@ -0,0 +1,181 @@
+# sweep.py - find out which rectangles a set of shapes packs, one size per worker process
+import csv
+import sys
+from argparse import ArgumentParser
+from multiprocessing import Pool
+from os import cpu_count
+from time import perf_counter
+
+from budget import Budget, within
+from common import Board, rebuild_shapes
+from feasibility import infeasible
+from polyomino import compile_shapes, parse
+from strategy import fill_with, strategies
+import hexsol
+import single_packing
+
+# name -> shape table, unique, and the first orientation the search tries
+shape_sets = {"pentominos": (hexsol.shapes, True, 0)}
+for name, (table, unique) in single_packing.shape_sets.items():
+    shape_sets[name] = (table, unique, single_packing.first_piece)
+
+columns = ["width", "length", "status", "solutions", "seconds", "nodes", "first_seconds", "witness"]
+
+
+def build(shapes, width, length, pieces=()):
+    """
+    the empty board for one size, and the first orientation to search from
+    """
+    if pieces:
+        table = compile_shapes([parse(piece) for piece in pieces], width + 2)
+        board_object = Board(width, length, table, unique=False)
+        board_object.build_tables()
+        first_piece = 0
+    else:
+        table, unique, first_piece = shape_sets[shapes]
+        # rebuild_shapes scales the table in place, so every board gets its own copy
+        board_object = Board(width, length, [list(shape) for shape in table], unique=unique)
+        rebuild_shapes(board_object)
+    board_object.name = shapes
+    return board_object, first_piece
+
+
+def solve_size(task):
+    """
+    the results row for one size: skipped if the squares cannot add up, else the packings
+    counted within the budget, with the first one as piece_index:loc placements
+    """
+    width, length, settings = task
+    board_object, first_piece = build(settings["shapes"], width, length, settings["pieces"])
+    row = dict(width=width, length=length, solutions=0, seconds=0.0, nodes=0)
+    start = perf_counter()
+    reason = infeasible(board_object)
+    if reason is not None:
+        row.update(status=f"no {reason}", seconds=round(perf_counter() - start, 3))
+        return row
+    fill = None
+    if settings["order"] != "first":
+        fill = fill_with(settings["order"], first_piece)
+    budget = Budget(solutions=settings["max_solutions"], seconds=settings["max_seconds"])
+    for solution in within(board_object, budget, first_piece=first_piece, fill=fill):
+        if budget.found == 1:
+            row["first_seconds"] = round(perf_counter() - start, 3)
+            row["witness"] = " ".join(f"{piece_index}:{loc}" for piece_index, loc in solution)
+    row.update(
+        status=f"stopped by {budget.reason}" if budget.reason else "done",
+        solutions=budget.found,
+        seconds=round(perf_counter() - start, 3),
+        nodes=budget.nodes,
+    )
+    return row
+
+
+def sizes(widths, lengths):
+    """
+    every width by length, once: a rectangle and its transpose pack the same way
+    """
+    found = []
+    for width in widths:
+        for length in lengths:
+            if (length, width) in found:
+                continue
+            found.append((width, length))
+    return found
+
+
+def sweep(pairs, settings, processes=None):
+    """
+    yield the results row of every size as it finishes, the smallest boards are started first
+    """
+    tasks = [(width, length, settings) for width, length in sorted(pairs, key=lambda p: p[0] * p[1])]
+    # one size per task, so a slow size does not hold up the others
+    with Pool(processes or cpu_count()) as pool:
+        yield from pool.imap_unordered(solve_size, tasks, chunksize=1)
+
+
+def span(text):
+    # 6 or 3:8, both ends included
+    first, _, last = text.partition(":")
+    return range(int(first), int(last or first) + 1)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Find which rectangles a set of shapes packs.")
+    parser.add_argument(
+        "--shapes",
+        dest="shapes",
+        choices=sorted(shape_sets),
+        default="pentominos",
+        help="the shapes to pack",
+    )
+    parser.add_argument(
+        "--piece",
+        dest="pieces",
+        action="append",
+        default=[],
+        help="pack this piece instead of --shapes, drawn as rows of X separated by /",
+    )
+    parser.add_argument(
+        "--widths", dest="widths", type=span, default=span("3:8"), help="the widths, e.g. 3:8"
+    )
+    parser.add_argument(
+        "--lengths", dest="lengths", type=span, default=span("3:20"), help="the lengths, e.g. 3:20"
+    )
+    parser.add_argument(
+        "--order",
+        dest="order",
+        choices=sorted(strategies),
+        default="first",
+        help="which empty square the search fills next",
+    )
+    parser.add_argument(
+        "--max-solutions",
+        dest="max_solutions",
+        type=int,
+        default=None,
+        help="stop each size after this many packings, 1 to only find out if there is one",
+    )
+    parser.add_argument(
+        "--max-seconds",
+        dest="max_seconds",
+        type=float,
+        default=60.0,
+        help="stop each size after this many seconds",
+    )
+    parser.add_argument(
+        "--processes",
+        dest="processes",
+        type=int,
+        default=None,
+        help="the number of worker processes, one per cpu by default",
+    )
+    parser.add_argument(
+        "--output",
+        dest="output",
+        type=str,
+        default="-",
+        help="write the results table to this csv file, - for stdout",
+    )
+    args = parser.parse_args()
+    settings = dict(
+        shapes="pieces" if args.pieces else args.shapes,
+        pieces=args.pieces,
+        order=args.order,
+        max_solutions=args.max_solutions,
+        max_seconds=args.max_seconds,
+    )
+    rows = []
+    for row in sweep(sizes(args.widths, args.lengths), settings, args.processes):
+        rows.append(row)
+        print(
+            f"{row['width']}x{row['length']}: {row['status']}, "
+            f"{row['solutions']} solutions in {row['seconds']} s",
+            file=sys.stderr,
+        )
+    rows.sort(key=lambda row: (row["width"], row["length"]))
+    output = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    writer = csv.DictWriter(output, fieldnames=columns)
+    writer.writeheader()
+    writer.writerows(rows)
+    if output is not sys.stdout:
+        output.close()
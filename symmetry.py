@@ -0,0 +1,172 @@
+# symmetry.py - work out the symmetries of a board, and search only one packing of each symmetry class
+from common import Board
+from search import iter_solutions
+
+
+def board_symmetries(board_object: Board):
+    """
+    the reflections and rotations of the board that map the blocked squares onto blocked squares,
+    each as a list taking a board index to its image. The identity comes first.
+    call before any piece is placed
+    """
+    w2, l2 = board_object.w2, board_object.l2
+    transforms = [
+        lambda row, col: (row, col),
+        lambda row, col: (l2 - 1 - row, col),
+        lambda row, col: (row, w2 - 1 - col),
+        lambda row, col: (l2 - 1 - row, w2 - 1 - col),
+    ]
+    if w2 == l2:
+        transforms += [
+            lambda row, col: (col, row),
+            lambda row, col: (w2 - 1 - col, row),
+            lambda row, col: (col, l2 - 1 - row),
+            lambda row, col: (w2 - 1 - col, l2 - 1 - row),
+        ]
+    board = board_object.board
+    symmetries = []
+    for transform in transforms:
+        permutation = []
+        for i in range(0, w2 * l2):
+            row, col = transform(*board_object.board_index_to_row_col(i))
+            permutation.append(board_object.board_row_col_to_index(row, col))
+        if all((board[i] is None) == (board[permutation[i]] is None) for i in range(0, w2 * l2)):
+            symmetries.append(permutation)
+    return symmetries
+
+
+def placement_cells(board_object: Board, piece_index, loc):
+    return [loc] + [loc + k for k in board_object.shapes[piece_index][1:]]
+
+
+def placement_symmetries(board_object: Board):
+    """
+    the board symmetries that turn every placement into one the board can make,
+    with the same piece on a unique board, the identity first
+    """
+    placements = {}
+    for loc, piece_indices in enumerate(board_object.placements):
+        for piece_index in piece_indices:
+            cells = tuple(sorted(placement_cells(board_object, piece_index, loc)))
+            piece_type = board_object.shapes[piece_index][0]
+            placements[cells] = piece_type if board_object.unique else None
+    return [
+        symmetry
+        for symmetry in board_symmetries(board_object)
+        if all(
+            placements.get(tuple(sorted(symmetry[c] for c in cells)), -1) == piece_type
+            for cells, piece_type in placements.items()
+        )
+    ]
+
+
+class SymmetryBreaker(object):
+    """
+    cuts the search down to one packing per symmetry class of the board.
+
+    If there is a piece that is used exactly once, and whose placements the symmetries only
+    move among themselves, that piece is only placed in one placement of each orbit, and those
+    placements are the roots of the search, like the cross_all positions in hexsol.py.
+    A packing is then only a duplicate if the root placement is itself symmetric, which
+    is_duplicate checks for the symmetries that keep the root placement in place.
+    Without such a piece, is_duplicate compares every full board against all of its images.
+    """
+
+    def __init__(self, board_object: Board, piece=None):
+        self.symmetries = placement_symmetries(board_object)
+        self.piece = None
+        # root placement -> the symmetries other than the identity that leave it in place
+        self.stabilizers = {}
+        candidates = [piece] if piece is not None else self.candidates(board_object)
+        best = None
+        for candidate in candidates:
+            stabilizers = self.representatives(board_object, candidate)
+            if stabilizers is None:
+                continue
+            symmetric = sum(1 for stabilizer in stabilizers.values() if stabilizer)
+            if best is None or (len(stabilizers), symmetric) < best:
+                best = (len(stabilizers), symmetric)
+                self.piece = candidate
+                self.stabilizers = stabilizers
+
+    @staticmethod
+    def candidates(board_object):
+        if not board_object.unique:
+            return []
+        pieces = sorted(set(shape[0] for shape in board_object.shapes))
+        # with more area in the pieces than on the board, a piece might be left out
+        area = sum(board_object.piece_sizes[piece] for piece in pieces)
+        if area != sum(1 for cell in board_object.board if cell is None):
+            return []
+        return pieces
+
+    def representatives(self, board_object, piece):
+        """
+        the placements of piece that come first in their orbit, mapped to the symmetries that
+        fix them, or None if the symmetries take the piece's placements somewhere it can't go
+        """
+        placements = {}
+        for loc, piece_indices in enumerate(board_object.placements):
+            for piece_index in piece_indices:
+                if board_object.shapes[piece_index][0] == piece:
+                    cells = placement_cells(board_object, piece_index, loc)
+                    placements[tuple(sorted(cells))] = (piece_index, loc)
+        stabilizers = {}
+        for cells, placement in placements.items():
+            images = [tuple(sorted(symmetry[c] for c in cells)) for symmetry in self.symmetries]
+            if any(image not in placements for image in images):
+                return None
+            if min(images) != cells:
+                continue
+            stabilizers[placement] = [
+                symmetry
+                for symmetry, image in zip(self.symmetries[1:], images[1:])
+                if image == cells
+            ]
+        return stabilizers
+
+    def roots(self):
+        """
+        the prefixes to start the search from, in the same format as parallel.split takes
+        """
+        if self.piece is None:
+            return [()]
+        return [(placement,) for placement in sorted(self.stabilizers, key=lambda p: p[1])]
+
+    @staticmethod
+    def key(board_object, symmetry):
+        return sorted(
+            sorted(symmetry[c] for c in placement_cells(board_object, piece_index, loc))
+            for piece_index, loc in board_object.solution
+        )
+
+    def is_duplicate(self, board_object):
+        """
+        true for a full board that is not the smallest of the images it can be mapped to
+        """
+        if self.piece is None:
+            symmetries = self.symmetries[1:]
+        else:
+            root = next(
+                placement
+                for placement in board_object.solution
+                if board_object.shapes[placement[0]][0] == self.piece
+            )
+            symmetries = self.stabilizers[root]
+        if not symmetries:
+            return False
+        key = self.key(board_object, self.symmetries[0])
+        return any(self.key(board_object, symmetry) < key for symmetry in symmetries)
+
+
+def distinct_solutions(board_object: Board, breaker: SymmetryBreaker, fill=None, limit=None):
+    """
+    search.iter_solutions, for one packing of each symmetry class
+    """
+    return iter_solutions(
+        board_object,
+        limit=limit,
+        roots=breaker.roots(),
+        reject=breaker.is_duplicate,
+        fill=fill,
+    )